@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# Copyright (c) 2018, Zebula Sampedro, CU Boulder Research Computing
+
+"""
+Benchmarks for the options form render, parse, normalize and spawner start paths.
+
+Results are written as JSON so runs from different commits can be compared:
+
+    python benchmarks/bench_optionsspawner.py --output before.json
+    python benchmarks/bench_optionsspawner.py --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import types
+
+here = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+from traitlets.config import Config
+from jupyterhub.spawner import Spawner
+
+from optionsspawner import OptionsFormSpawner
+from optionsspawner.forms import (
+    OptionsForm,
+    TextInputField,
+    NumericalInputField,
+    CheckboxInputField,
+    SelectField,
+)
+
+
+FIELD_COUNTS = (10, 100, 1000)
+CHOICE_COUNTS = (10, 10000)
+SPAWNER_COUNTS = (1, 10000)
+
+
+class StandInSpawner(Spawner):
+    """Child spawner that starts instantly without launching a process."""
+
+    async def start(self):
+        return ('127.0.0.1', 8888)
+
+    async def poll(self):
+        return None
+
+    async def stop(self, now=False):
+        pass
+
+
+def make_fields(field_count, choice_count=10):
+    """Returns field_count fields cycling through every field type."""
+    choices = [('choice{}'.format(i), 'Choice {}'.format(i)) for i in range(choice_count)]
+    fields = []
+    for i in range(field_count):
+        kind = i % 4
+        trait_name = 'bench_attr_{}'.format(i)
+        if kind == 0:
+            fields.append(TextInputField(trait_name, attr_value='default'))
+        elif kind == 1:
+            fields.append(NumericalInputField(trait_name, attr_min=0, attr_max=100, attr_value=1))
+        elif kind == 2:
+            fields.append(CheckboxInputField(trait_name, attr_checked=True))
+        else:
+            fields.append(SelectField(trait_name, choices=choices, default=choices[-1][0]))
+    return fields
+
+
+def make_form_data(fields):
+    """Returns form data as submitted by the spawn page for the given fields."""
+    form_data = {}
+    for field in fields:
+        if isinstance(field, SelectField):
+            form_data[field.trait_name] = [str(field.default_value)]
+        elif isinstance(field, CheckboxInputField):
+            form_data[field.trait_name] = ['on']
+        elif isinstance(field, NumericalInputField):
+            form_data[field.trait_name] = ['42']
+        else:
+            form_data[field.trait_name] = ['submitted']
+    return form_data
+
+
+def make_user(i):
+    return types.SimpleNamespace(
+        name='bench-user-{}'.format(i),
+        escaped_name='bench-user-{}'.format(i),
+        url='/user/bench-user-{}/'.format(i),
+        groups=[],
+        server=None,
+    )
+
+
+def timeit(func, repeat):
+    """Returns the best wall time of `repeat` calls to func, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_render(fields):
+    return lambda: OptionsForm(fields).render()
+
+
+def bench_render_cold(fields):
+    """Renders without the fragments fields keep compiled across forms."""
+    def render():
+        for field in fields:
+            field.invalidate()
+        return OptionsForm(fields).render()
+    return render
+
+
+def bench_options_from_form(fields):
+    form = OptionsForm(fields)
+    form_data = make_form_data(fields)
+    return lambda: form.get_options_from_form(form_data)
+
+
+def bench_normalize(fields):
+    form = OptionsForm(fields)
+    user_options = form.get_options_from_form(make_form_data(fields))
+    return lambda: form.get_normalized_user_options(user_options)
+
+
+def bench_start(spawner_count, field_count=10):
+    fields = make_fields(field_count)
+    config = Config({
+        'OptionsFormSpawner': {
+            'form_fields': fields,
+            'child_class': StandInSpawner,
+        },
+    })
+    user_options = OptionsForm(fields).get_options_from_form(make_form_data(fields))
+
+    async def start_all():
+        for i in range(spawner_count):
+            spawner = OptionsFormSpawner(config=config, user=make_user(i))
+            spawner.user_options = user_options
+            await spawner.start()
+
+    return lambda: asyncio.run(start_all())
+
+
+def bench_apply_traits(field_count, skip_unchanged):
+    """Times applying unchanged form values to a spawner that already holds them."""
+    fields = make_fields(field_count)
+    config = Config({
+        'OptionsFormSpawner': {
+            'form_fields': fields,
+            'child_class': StandInSpawner,
+            'options_skip_unchanged_traits': skip_unchanged,
+        },
+    })
+    spawner = OptionsFormSpawner(config=config, user=make_user(0))
+    spawner.user_options = OptionsForm(fields).get_options_from_form(make_form_data(fields))
+    normalized_options = spawner._get_normalized_options()
+    spawner._set_trait_values_from_options(normalized_options=normalized_options)
+    return lambda: spawner._set_trait_values_from_options(normalized_options=normalized_options)
+
+
+def collect_cases(quick=False):
+    """Returns a list of (case name, benchmark function) pairs."""
+    field_counts = FIELD_COUNTS[:2] if quick else FIELD_COUNTS
+    choice_counts = CHOICE_COUNTS[:1] if quick else CHOICE_COUNTS
+    spawner_counts = (1, 100) if quick else SPAWNER_COUNTS
+    cases = []
+    for field_count in field_counts:
+        fields = make_fields(field_count)
+        cases.append(('render[fields={}]'.format(field_count), bench_render(fields)))
+        cases.append(('render_cold[fields={}]'.format(field_count), bench_render_cold(fields)))
+        cases.append(('options_from_form[fields={}]'.format(field_count),
+            bench_options_from_form(fields)))
+        cases.append(('normalize[fields={}]'.format(field_count), bench_normalize(fields)))
+        for skip_unchanged in (False, True):
+            cases.append(('apply_traits[fields={},skip={}]'.format(field_count, skip_unchanged),
+                bench_apply_traits(field_count, skip_unchanged)))
+    for choice_count in choice_counts:
+        # A single select field isolates the cost of large choice lists.
+        fields = make_fields(4, choice_count=choice_count)[3:]
+        cases.append(('render[choices={}]'.format(choice_count), bench_render(fields)))
+        cases.append(('render_cold[choices={}]'.format(choice_count), bench_render_cold(fields)))
+        cases.append(('normalize[choices={}]'.format(choice_count), bench_normalize(fields)))
+    for spawner_count in spawner_counts:
+        cases.append(('start[spawners={}]'.format(spawner_count), bench_start(spawner_count)))
+    return cases
+
+
+def get_commit():
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=here,
+            stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('utf-8').strip()
+
+
+def compare(results, baseline):
+    """Prints the ratio of each result to the matching baseline result."""
+    print('{:<32} {:>12} {:>12} {:>8}'.format('case', 'baseline', 'current', 'ratio'))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['seconds']
+        after = result['seconds']
+        ratio = after / before if before else float('inf')
+        print('{:<32} {:>12.6f} {:>12.6f} {:>8.2f}'.format(name, before, after, ratio))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', default='benchmark_results.json',
+        help='Path of the JSON results file to write.')
+    parser.add_argument('--compare', help='Path of a previous JSON results file to compare to.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs per case.')
+    parser.add_argument('--quick', action='store_true', help='Skip the largest cases.')
+    parser.add_argument('--filter', default='', help='Only run cases containing this string.')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, func in collect_cases(quick=args.quick):
+        if args.filter not in name:
+            continue
+        # Large spawner counts are too slow to repeat.
+        repeat = 1 if 'spawners=10000' in name else args.repeat
+        seconds = timeit(func, repeat)
+        results[name] = {'seconds': seconds, 'repeat': repeat}
+        print('{:<32} {:>12.6f}s'.format(name, seconds))
+
+    report = {
+        'commit': get_commit(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        compare(results, baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,50 @@
-from .optionsspawner import *
-from . import forms
+"""
+Options Form Spawner
+
+Public names are imported lazily on first access, so importing the package, e.g. to configure
+form fields, does not import JupyterHub, tornado or wrapspawner.
+"""
+
+import importlib
+
+
+# Public names of the package, by the submodule defining them.
+_lazy_names = {
+    'OptionsFormSpawner': 'optionsspawner',
+    'get_form_fields': 'optionsspawner',
+    'get_compiled_options_form': 'optionsspawner',
+    'get_trait_class': 'optionsspawner',
+    'get_executor': 'optionsspawner',
+    'get_options_store': 'optionsspawner',
+    'get_admission_controller': 'optionsspawner',
+    # Exported by the package before imports were lazy.
+    'OptionsForm': 'forms',
+    'FormField': 'forms',
+}
+
+_submodules = {
+    'admission',
+    'forms',
+    'handlers',
+    'metrics',
+    'optionsspawner',
+    'store',
+    'utils',
+}
+
+__all__ = sorted(_lazy_names)
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    if name not in _lazy_names:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    module = importlib.import_module('.' + _lazy_names[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names) | _submodules)
@@ -0,0 +1,135 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Boulder Research Computing
+
+"""
+Admission control for spawner starts, keyed on the values of user options.
+"""
+
+import asyncio
+import collections
+import contextlib
+import time
+from .metrics import (
+    OPTIONS_ADMISSION_QUEUE_DEPTH,
+    OPTIONS_ADMISSION_WAIT_DURATION_SECONDS,
+)
+
+
+
+class AdmissionQueue:
+    """
+    Admits up to `limit` concurrent holders. Once it is full, waiters are admitted one at a
+    time in the order they arrived, as holders release their slots.
+    """
+
+    def __init__(self, limit):
+        self._limit = limit
+        self._active = 0
+        self._waiters = collections.deque()
+
+    @property
+    def active(self):
+        return self._active
+
+    @property
+    def depth(self):
+        """Returns the number of waiters that have not been admitted yet."""
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    async def acquire(self):
+        if self._active < self._limit and not self._waiters:
+            self._active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the waiter gave up, pass it on.
+                self.release()
+            elif waiter in self._waiters:
+                # A release in the same loop iteration may already have dropped it.
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        """Hands the slot over to the longest waiting waiter, or frees it."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+
+class AdmissionController:
+    """
+    Limits the number of concurrent operations per value of each limited trait. `limits` maps
+    trait names to the number of operations admitted at once for each value of the trait, e.g.
+    `{'partition': 10}` admits 10 concurrent starts per partition.
+    """
+
+    def __init__(self, limits):
+        self._limits = dict(limits)
+        self._queues = {}
+
+    @property
+    def limits(self):
+        return dict(self._limits)
+
+    def get_keys(self, normalized_options):
+        """Returns the sorted (trait name, value) keys limiting operations with these options."""
+        return sorted(
+            (trait_name, normalized_options[trait_name])
+            for trait_name in self._limits if trait_name in normalized_options
+        )
+
+    def get_queue(self, key):
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = AdmissionQueue(self._limits[key[0]])
+            self._queues[key] = queue
+        return queue
+
+    @contextlib.asynccontextmanager
+    async def admit(self, normalized_options, timeout=None):
+        """
+        Waits for a slot for each limited value of the normalized options, then holds the slots
+        for the duration of the context. Slots are acquired in sorted key order, so operations
+        limited on several traits cannot deadlock. Raises a TimeoutError if the slots are not
+        all acquired within `timeout` seconds.
+        """
+        keys = self.get_keys(normalized_options)
+        acquired = []
+
+        async def acquire_all():
+            for key in keys:
+                queue = self.get_queue(key)
+                trait_name, value = key
+                depth = OPTIONS_ADMISSION_QUEUE_DEPTH.labels(field=trait_name, value=str(value))
+                depth.inc()
+                started = time.perf_counter()
+                try:
+                    await queue.acquire()
+                finally:
+                    depth.dec()
+                OPTIONS_ADMISSION_WAIT_DURATION_SECONDS.labels(field=trait_name).observe(
+                    time.perf_counter() - started)
+                acquired.append(queue)
+
+        try:
+            await asyncio.wait_for(acquire_all(), timeout=timeout)
+        except asyncio.TimeoutError:
+            for queue in acquired:
+                queue.release()
+            error_message = 'Spawn was not admitted within {} seconds.'.format(timeout)
+            raise TimeoutError(error_message)
+        except BaseException:
+            for queue in acquired:
+                queue.release()
+            raise
+        try:
+            yield
+        finally:
+            for queue in acquired:
+                queue.release()
@@ -1,4 +1,37 @@
-from .base import *
-from .characterfield import *
-from .checkboxfield import *
-from .selectfield import *
+"""
+Options form fields. Field classes are imported lazily on first access.
+"""
+
+import importlib
+
+
+# Public names of the package, by the submodule defining them.
+_lazy_names = {
+    'CompiledForm': 'base',
+    'FieldSpec': 'base',
+    'OptionsForm': 'base',
+    'FormField': 'base',
+    'FieldConstraint': 'constraints',
+    'TextInputField': 'characterfield',
+    'NumericalInputField': 'characterfield',
+    'CheckboxInputField': 'checkboxfield',
+    'SelectField': 'selectfield',
+    'PresetField': 'presetfield',
+    'get_field_class': 'registry',
+    'create_field': 'registry',
+}
+
+__all__ = sorted(_lazy_names)
+
+
+def __getattr__(name):
+    if name not in _lazy_names:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    module = importlib.import_module('.' + _lazy_names[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names))
@@ -1,9 +1,111 @@
 # Copyright (c) 2018, Zebula Sampedro, CU Boulder Research Computing
 
 import abc
+import asyncio
+import gzip
+import hashlib
+import json
+import weakref
+from ..metrics import OPTIONS_VALIDATION_FAILURES
+from ..utils import (
+    LRUCache,
+    TTLCache,
+    call_maybe_async,
+)
 
 
 
+class CompiledForm:
+    """
+    The immutable rendered output of an OptionsForm, as text and UTF-8 bytes, identified by the
+    SHA-256 `digest` of its content. Large forms also provide a gzip compressed copy of the
+    bytes, compressed on first access, otherwise `gzipped` is None.
+    """
+
+    __slots__ = ('html', 'html_bytes', 'digest', '_gzip_min_size', '_gzipped', '_fragments')
+
+    # Stored in _gzipped until the compressed copy is first requested.
+    _not_compressed = object()
+
+    def __init__(self, fragments, gzip_min_size=None):
+        html = '\n'.join(fragments)
+        html_bytes = html.encode('utf-8')
+        object.__setattr__(self, 'html', html)
+        object.__setattr__(self, 'html_bytes', html_bytes)
+        object.__setattr__(self, 'digest', hashlib.sha256(html_bytes).hexdigest())
+        object.__setattr__(self, '_gzip_min_size', gzip_min_size)
+        object.__setattr__(self, '_gzipped', self._not_compressed)
+        object.__setattr__(self, '_fragments', tuple(fragments))
+
+    @property
+    def gzipped(self):
+        gzipped = self._gzipped
+        if gzipped is self._not_compressed:
+            gzipped = None
+            if self._gzip_min_size is not None and len(self.html_bytes) >= self._gzip_min_size:
+                gzipped = gzip.compress(self.html_bytes)
+            object.__setattr__(self, '_gzipped', gzipped)
+        return gzipped
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CompiledForm is immutable.')
+
+    def matches(self, fragments):
+        """Returns True if this form was compiled from exactly these fragment objects."""
+        return len(fragments) == len(self._fragments) and all(
+            fragment is compiled for fragment, compiled in zip(fragments, self._fragments)
+        )
+
+
+class FieldSpec:
+    """
+    The immutable definition of a form field. Specs hash and compare by value, and are interned,
+    so all fields with identical definitions share one spec instance.
+    """
+
+    __slots__ = ('field_class', 'trait_name', 'definition', '_hash', '__weakref__')
+
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, field_class, trait_name, definition):
+        key = (field_class, definition)
+        try:
+            spec_hash = hash(key)
+        except TypeError:
+            # Attribute values such as lists are not hashable, their representation is.
+            key = (field_class, repr(definition))
+            spec_hash = hash(key)
+        spec = cls._interned.get(key)
+        if spec is None:
+            spec = object.__new__(cls)
+            object.__setattr__(spec, 'field_class', field_class)
+            object.__setattr__(spec, 'trait_name', trait_name)
+            object.__setattr__(spec, 'definition', definition)
+            object.__setattr__(spec, '_hash', spec_hash)
+            spec = cls._interned.setdefault(key, spec)
+        return spec
+
+    def __setattr__(self, name, value):
+        raise AttributeError('FieldSpec is immutable.')
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, FieldSpec):
+            return NotImplemented
+        return (
+            self._hash == other._hash and
+            self.field_class is other.field_class and
+            self.definition == other.definition
+        )
+
+    def __repr__(self):
+        return '{}({}, {!r})'.format(type(self).__name__, self.field_class.__name__, self.trait_name)
+
+
 class OptionsForm:
     """
     Instances of this class are used to render a spawner options form for a set of form fields.
@@ -11,39 +113,618 @@ class OptionsForm:
 
     validation_style = ("""<style>.form-control:invalid {border-color:red;color:red;}</style>\n""")
 
-    def __init__(self, form_fields=[]):
-        """Takes an optional list of FormField subclasses and initializes a form builder."""
+    # Compiled forms at least this many bytes long also keep a gzip compressed copy.
+    gzip_min_size = 64 * 1024
+
+    digest_field_name = 'options_form_digest'
+    digest_template = ("""<input type="hidden" name="{name}" value="{digest}">\n""")
+
+    previous_options_field_name = 'options_form_previous'
+    # Not a submit button, so it does not become the default button of the spawn form, which
+    # pressing Enter in an input would otherwise trigger.
+    previous_options_template = ("""<input type="hidden" id="id_{name}" name="{name}" value="">\n"""
+    """<button type="button" id="id_{name}_button" class="btn btn-default">Start with previous settings</button>\n"""
+    """<script>{script}</script>\n""")
+
+    # Marks the submission as a start with previous options, which skips input validation.
+    previous_options_script_template = ("""(function () {{"""
+    """var button = document.getElementById("id_{name}_button");"""
+    """button.addEventListener("click", function () {{"""
+    """document.getElementById("id_{name}").value = "1";"""
+    """button.form.noValidate = true;"""
+    """button.form.requestSubmit();"""
+    """}});"""
+    """}})();""")
+
+    fieldsets_field_name = 'options_form_fieldsets'
+    fieldset_template = ("""<details class="options-fieldset" data-fieldset="{name}" data-version="{digest}">\n"""
+    """<summary>{label}</summary>\n"""
+    """<div id="id_fieldset_{name}"></div>\n"""
+    """</details>\n""")
+
+    # Loads the fields of a collapsed fieldset from the hub the first time it is opened, and
+    # records that it was loaded, so that its submitted inputs are used. The optionsfieldsetload
+    # event lets the prefill script set the loaded inputs to previous options.
+    fieldset_script = ("""<script>(function () {"""
+    """document.querySelectorAll("details.options-fieldset").forEach(function (details) {"""
+    """details.addEventListener("toggle", function () {"""
+    """if (!details.open || details.dataset.loaded) { return; }"""
+    """details.dataset.loaded = "1";"""
+    """var name = details.dataset.fieldset;"""
+    """var url = window.jhdata.base_url + "options/fieldset/" + name + "?v=" + details.dataset.version;"""
+    """fetch(url, {credentials: "same-origin"})"""
+    """.then(function (response) { return response.text(); })"""
+    """.then(function (html) {"""
+    """var container = document.getElementById("id_fieldset_" + name);"""
+    """container.innerHTML = html;"""
+    """container.querySelectorAll("script").forEach(function (script) {"""
+    """var loaded = document.createElement("script");"""
+    """loaded.textContent = script.textContent;"""
+    """script.replaceWith(loaded);"""
+    """});"""
+    """var marker = document.createElement("input");"""
+    """marker.type = "hidden";"""
+    """marker.name = "options_form_fieldsets";"""
+    """marker.value = name;"""
+    """container.appendChild(marker);"""
+    """container.dispatchEvent(new Event("optionsfieldsetload", {bubbles: true}));"""
+    """});"""
+    """});"""
+    """});"""
+    """})();</script>\n""")
+
+    # Sets each input to a previously submitted value, once the form is in the page, and the
+    # inputs of each collapsed fieldset once it is loaded.
+    prefill_script_template = ("""(function () {{"""
+    """var options = {options};"""
+    """function prefill(root) {{"""
+    """Object.keys(options).forEach(function (name) {{"""
+    """var input = document.getElementById("id_" + name);"""
+    """if (!input || !root.contains(input)) {{ return; }}"""
+    """if (input.type === "checkbox") {{ input.checked = options[name]; }}"""
+    """else {{ input.value = options[name]; }}"""
+    """}});"""
+    """}}"""
+    """prefill(document);"""
+    """document.addEventListener("optionsfieldsetload", function (event) {{ prefill(event.target); }});"""
+    """}})();""")
+
+    def __init__(self, form_fields=[], variant_cache_size=32, constraints=(),
+                 collapsed_fieldsets=None):
+        """
+        Takes an optional list of FormField subclasses and initializes a form builder. Up to
+        `variant_cache_size` per-group variants of the form are kept, see `get_variant`.
+        `constraints` is an optional list of FieldConstraints checked against the normalized
+        options of every submission. `collapsed_fieldsets` maps fieldset names to labels; the
+        fields of these fieldsets are left out of the rendered form, which loads them on demand
+        with `render_fieldset`. Fields of fieldsets that were never loaded keep their defaults,
+        so a ValueError is raised if a collapsed field is required and has no valid default.
+        """
         self._fields = form_fields
+        self._collapsed_fieldsets = {
+            name: label for name, label in (collapsed_fieldsets or {}).items()
+            if any(field.fieldset == name for field in form_fields)
+        }
+        for field in form_fields:
+            if field.fieldset in self._collapsed_fieldsets:
+                self._check_collapsible(field)
+        self._inline_fields = [
+            field for field in form_fields if field.fieldset not in self._collapsed_fieldsets
+        ]
+        self._fieldset_fields = {
+            name: [field for field in form_fields if field.fieldset == name]
+            for name in self._collapsed_fieldsets
+        }
+        self._compiled_fieldsets = {}
+        self._fieldset_placeholders = {}
+        self._constraints = tuple(constraints)
+        self._constraint_tables = self._compile_constraints(self._constraints)
+        self._fingerprint = None
+        # Each distinct set of groups restricting a field is assigned one bit of the visibility
+        # mask of a user, in the order the sets first appear.
+        self._visibility_rules = {}
+        for field in form_fields:
+            if field.groups is not None and field.groups not in self._visibility_rules:
+                self._visibility_rules[field.groups] = 1 << len(self._visibility_rules)
+        self._variants = LRUCache(variant_cache_size)
+        # Each field resolves its trait type once at construction, so normalization only needs
+        # the bound normalizer of each field.
+        self._normalization_plan = tuple(
+            (field.trait_name, field.normalize_user_option) for field in form_fields
+        )
+        self._json_normalization_plan = tuple(
+            (field.trait_name, field.normalize_json_option) for field in form_fields
+        )
+        self._trait_names = frozenset(field.trait_name for field in form_fields)
+        self._json_schema = None
+        self._default_options = None
+        self._is_checkbox = {
+            field.trait_name: field.input_type == 'checkbox' for field in form_fields
+        }
+        self._resolvers = tuple(
+            (field.trait_name, field.resolver) for field in form_fields if field.resolver
+        )
+        self._validated_fields = tuple(field for field in form_fields if field.validators)
+        self._preset_plan = self._compile_presets(form_fields)
+        # Spawner classes whose traits are known to include every preset trait.
+        self._preset_checked_classes = weakref.WeakSet()
+        self._dynamic = any(field.dynamic for field in form_fields)
+        self._compiled = None
+        # The fragments the form digest was computed from, and the digest.
+        self._version = None
+
+    @staticmethod
+    def _check_collapsible(field):
+        """
+        Raises a ValueError if the field cannot be submitted without being loaded into the form,
+        i.e. if its default does not normalize.
+        """
+        try:
+            field.normalize_user_option(field.default_user_option())
+        except ValueError:
+            error_message = 'Field {} has no valid default and cannot be in collapsed fieldset {}.'
+            raise ValueError(error_message.format(field.trait_name, field.fieldset))
 
     @property
     def fields(self):
         return self._fields
 
+    @property
+    def constraints(self):
+        return self._constraints
+
+    @property
+    def collapsed_fieldsets(self):
+        """Returns the labels of the collapsed fieldsets of this form, by fieldset name."""
+        return dict(self._collapsed_fieldsets)
+
+    @property
+    def resolvers(self):
+        """Returns the (trait name, resolver) pairs of the fields that have a resolver."""
+        return self._resolvers
+
+    @property
+    def validated_fields(self):
+        """Returns the fields that have validators."""
+        return self._validated_fields
+
+    @property
+    def dynamic(self):
+        """Returns True if any field's rendered output can change after construction."""
+        return self._dynamic
+
+    @property
+    def fingerprint(self):
+        """Returns a digest that identifies the definitions of the fields in this form."""
+        if self._fingerprint is None:
+            definitions = repr([field.spec.definition for field in self._fields])
+            self._fingerprint = hashlib.sha1(definitions.encode('utf-8')).hexdigest()
+        return self._fingerprint
+
+    @property
+    def grouped(self):
+        """Returns True if any field is restricted to members of specific groups."""
+        return bool(self._visibility_rules)
+
+    def get_visibility_mask(self, group_names):
+        """Returns a bitmask of the group visibility rules satisfied by the given group names."""
+        mask = 0
+        for groups, bit in self._visibility_rules.items():
+            if not groups.isdisjoint(group_names):
+                mask |= bit
+        return mask
+
+    def get_variant(self, group_names):
+        """
+        Returns an (OptionsForm, rendered form) pair containing the fields visible to a member of
+        the given groups. Variants are built once per distinct visibility mask and cached.
+        """
+        mask = self.get_visibility_mask(group_names)
+        variant = self._variants.get(mask)
+        if variant is None:
+            visible_fields = [
+                field for field in self._fields
+                if field.groups is None or mask & self._visibility_rules[field.groups]
+            ]
+            visible_names = {field.trait_name for field in visible_fields}
+            visible_constraints = [
+                constraint for constraint in self._constraints
+                if constraint.trait_names <= visible_names
+            ]
+            variant_form = OptionsForm(visible_fields,
+                constraints=visible_constraints,
+                collapsed_fieldsets=self._collapsed_fieldsets
+            )
+            variant = (variant_form, variant_form.render_versioned())
+            self._variants.put(mask, variant)
+        return variant
+
+    def compile(self):
+        """
+        Returns the CompiledForm for this form, built from the cached fragment of each field.
+        The form is recompiled only if a dynamic field has rendered a new fragment.
+        """
+        if self._compiled is not None and not self._dynamic:
+            return self._compiled
+        fragments = [self.validation_style]
+        fragments.extend(field.compile() for field in self._inline_fields)
+        if self._collapsed_fieldsets:
+            fragments.extend(self._compile_fieldset_placeholder(name) for name in self._collapsed_fieldsets)
+            fragments.append(self.fieldset_script)
+        if self._compiled is None or not self._compiled.matches(fragments):
+            self._compiled = CompiledForm(fragments, gzip_min_size=self.gzip_min_size)
+        return self._compiled
+
+    def compile_fieldset(self, name):
+        """
+        Returns the CompiledForm of the fields of a collapsed fieldset, or None if this form has
+        no collapsed fieldset with that name.
+        """
+        if name not in self._collapsed_fieldsets:
+            return None
+        compiled = self._compiled_fieldsets.get(name)
+        if compiled is not None and not self._dynamic:
+            return compiled
+        fragments = [field.compile() for field in self._fieldset_fields[name]]
+        if compiled is None or not compiled.matches(fragments):
+            compiled = CompiledForm(fragments, gzip_min_size=self.gzip_min_size)
+            self._compiled_fieldsets[name] = compiled
+        return compiled
+
+    def render_fieldset(self, name):
+        """Returns the rendered fields of a collapsed fieldset, or None if there is none."""
+        compiled = self.compile_fieldset(name)
+        return compiled.html if compiled is not None else None
+
+    def _compile_fieldset_placeholder(self, name):
+        """
+        Returns the collapsed placeholder of a fieldset, versioned by the digest of its fields,
+        so the digest of the form changes with them. Unchanged placeholders are reused as is.
+        """
+        digest = self.compile_fieldset(name).digest
+        placeholder = self._fieldset_placeholders.get(name)
+        if placeholder is None or placeholder[0] != digest:
+            html = self.fieldset_template.format(
+                name=name,
+                label=self._collapsed_fieldsets[name],
+                digest=digest
+            )
+            placeholder = (digest, html)
+            self._fieldset_placeholders[name] = placeholder
+        return placeholder[1]
+
     def render(self):
-        rendered_fields = [self.validation_style]
-        for field in self._fields:
-            rendered_fields.append(field.render())
-        return '\n'.join(rendered_fields)
+        return self.compile().html
+
+    @property
+    def digest(self):
+        """Returns the content hash of the compiled form, suitable for use as an ETag."""
+        return self.compile().digest
+
+    @property
+    def version(self):
+        """
+        Returns the SHA-256 digest of the version of the form's fields, submitted with the form
+        to detect submissions from a different version. Unlike `digest`, it leaves capacity
+        annotations out, as they may change between rendering and submission.
+        """
+        if self._version is not None and not self._dynamic:
+            return self._version[1]
+        fragments = tuple(field.compile_version() for field in self._fields)
+        if self._version is not None:
+            previous_fragments, digest = self._version
+            if len(fragments) == len(previous_fragments) and all(
+                fragment is previous for fragment, previous in zip(fragments, previous_fragments)
+            ):
+                return digest
+        version = hashlib.sha256()
+        for fragment in fragments:
+            version.update(fragment.encode('utf-8'))
+            version.update(b'\0')
+        self._version = (fragments, version.hexdigest())
+        return self._version[1]
 
-    def get_options_from_form(self, form_data):
-        """Returns parsed user options from form data."""
+    def render_versioned(self):
+        """Returns the rendered form followed by a hidden field holding the form version."""
+        return self.render() + self.digest_template.format(
+            name=self.digest_field_name,
+            digest=self.version
+        )
+
+    def check_digest(self, form_data):
+        """
+        Raises a ValueError if the form data was submitted from a different version of this form.
+        Form data without a digest, e.g. from API clients, is accepted.
+        """
+        submitted = form_data.get(self.digest_field_name)
+        if submitted and submitted[0] != self.version:
+            error_message = 'The options form has changed since it was loaded, please reload it.'
+            raise ValueError(error_message)
+
+    def render_previous_options(self, user_options):
+        """
+        Returns a button to start with previously submitted user options, and a script setting
+        the form inputs to their values. The compiled form itself is left untouched. Returns an
+        empty string if the user options are no longer valid for this form.
+        """
+        normalized_options, _ = self.validate_many([user_options])[0]
+        if normalized_options is None:
+            return ''
+        # Inputs hold checkbox states as booleans, and every other value as its rendered string.
+        prefill = {
+            trait_name: bool(value) if self._is_checkbox[trait_name] else str(value)
+            for trait_name, value in normalized_options.items()
+        }
+        script = self.prefill_script_template.format(
+            options=json.dumps(prefill, sort_keys=True).replace('</', '<\\/')
+        ) + self.previous_options_script_template.format(name=self.previous_options_field_name)
+        return self.previous_options_template.format(
+            name=self.previous_options_field_name,
+            script=script
+        )
+
+    def is_previous_options_request(self, form_data):
+        """Returns True if the form was submitted to start with previous user options."""
+        value = form_data.get(self.previous_options_field_name)
+        return bool(value and value[0])
+
+    def get_options_from_form(self, form_data, previous_options=None):
+        """
+        Returns parsed user options from form data. Fields of collapsed fieldsets that were never
+        loaded into the form take their option from `previous_options`, the user options of a
+        previous start, if given, otherwise their default option.
+        """
         options = {}
-        for field in self._fields:
+        for field in self._inline_fields:
             value = form_data.get(field.trait_name, None)
             options[field.trait_name] = value
+        if self._collapsed_fieldsets:
+            loaded = set(form_data.get(self.fieldsets_field_name, None) or ())
+            previous_options = previous_options or {}
+            for name, fields in self._fieldset_fields.items():
+                for field in fields:
+                    if name in loaded:
+                        options[field.trait_name] = form_data.get(field.trait_name, None)
+                    elif field.trait_name in previous_options:
+                        options[field.trait_name] = previous_options[field.trait_name]
+                    else:
+                        options[field.trait_name] = field.default_user_option()
         return options
 
+    def json_schema(self):
+        """
+        Returns a JSON Schema describing natively typed JSON user options for this form. The
+        schema is built once, unless a field is dynamic, and must not be modified by callers.
+        """
+        if self._json_schema is None or self._dynamic:
+            self._json_schema = {
+                '$schema': 'https://json-schema.org/draft/2020-12/schema',
+                'type': 'object',
+                'properties': {field.trait_name: field.json_schema() for field in self._fields},
+                'required': [field.trait_name for field in self._fields if field.required],
+                'additionalProperties': False,
+            }
+        return self._json_schema
+
+    @staticmethod
+    def is_form_data(user_options):
+        """
+        Returns True if user options are in the shape of submitted form data, where every value
+        is a list or None, rather than natively typed JSON values.
+        """
+        return all(value is None or isinstance(value, list) for value in user_options.values())
+
     def get_normalized_user_options(self, user_options):
         """
         Takes user options from spawner and returns the values normalized for the
-        traitlet associated with each form field.
+        traitlet associated with each form field. User options may be form data, or natively
+        typed JSON values described by `json_schema`. Empty user options (e.g. spawns requested
+        through the REST API without options) return a copy of the cached field defaults, which
+        are only cached if no field is dynamic.
+        """
+        if not user_options:
+            if self._dynamic:
+                # Defaults of dynamic fields can change with their choices, so are not cached.
+                normalized_options = self._normalize_user_options({})
+            else:
+                if self._default_options is None:
+                    self._default_options = self._normalize_user_options({})
+                normalized_options = dict(self._default_options)
+        elif self.is_form_data(user_options):
+            normalized_options = self._normalize_user_options(user_options)
+        else:
+            self._check_json_option_names(user_options)
+            normalized_options = self._normalize_user_options(user_options,
+                plan=self._json_normalization_plan
+            )
+        if self._constraint_tables:
+            violations = self.check_constraints(normalized_options)
+            if violations:
+                for trait_name, _ in violations:
+                    OPTIONS_VALIDATION_FAILURES.labels(field=trait_name, error='ValueError').inc()
+                raise ValueError('\n'.join(message for _, message in violations))
+        return normalized_options
+
+    @staticmethod
+    def _compile_presets(form_fields):
+        """
+        Returns the (trait name, presets) pairs of the fields with presets. Raises a ValueError
+        if a preset sets the trait of a form field, or a trait also set by another preset field.
         """
+        trait_names = {field.trait_name for field in form_fields}
+        preset_trait_names = {}
+        plan = []
+        for field in form_fields:
+            if not field.presets:
+                continue
+            for trait_values in field.presets.values():
+                for trait_name in trait_values:
+                    if trait_name in trait_names:
+                        error_message = 'Preset field {} sets the trait of form field {}.'.format(
+                            field.trait_name, trait_name)
+                        raise ValueError(error_message)
+                    owner = preset_trait_names.setdefault(trait_name, field.trait_name)
+                    if owner != field.trait_name:
+                        error_message = 'Trait {} is set by preset fields {} and {}.'.format(
+                            trait_name, owner, field.trait_name)
+                        raise ValueError(error_message)
+            plan.append((field.trait_name, field.presets))
+        return tuple(plan)
+
+    @property
+    def preset_trait_names(self):
+        """Returns the names of every trait set by the presets of this form."""
+        return frozenset(
+            trait_name
+            for _, presets in self._preset_plan
+            for trait_values in presets.values()
+            for trait_name in trait_values
+        )
+
+    def check_preset_traits(self, spawner_class):
+        """Raises a ValueError if a preset sets a trait that the spawner class does not have."""
+        if not self._preset_plan or spawner_class in self._preset_checked_classes:
+            return
+        unknown = sorted(self.preset_trait_names.difference(spawner_class.class_trait_names()))
+        if unknown:
+            error_message = 'Presets set traits unknown to {}: {}.'.format(
+                spawner_class.__name__, ', '.join(unknown))
+            raise ValueError(error_message)
+        self._preset_checked_classes.add(spawner_class)
+
+    def expand_presets(self, normalized_options):
+        """
+        Returns the trait values to apply for normalized options: the options, updated with the
+        bundle of trait values of each selected preset.
+        """
+        if not self._preset_plan:
+            return normalized_options
+        trait_values = dict(normalized_options)
+        for trait_name, presets in self._preset_plan:
+            trait_values.update(presets[normalized_options[trait_name]])
+        return trait_values
+
+    def _compile_constraints(self, constraints):
+        """
+        Compiles the constraints into one table per governing trait, mapping each of its
+        constrained values to the rules that apply while the trait has that value.
+        """
+        labels = {field.trait_name: field.label for field in self._fields}
+        tables = {}
+        for constraint in constraints:
+            table = tables.setdefault(constraint.trait_name, {})
+            table.setdefault(constraint.value, []).extend(constraint.compile(labels))
+        return {
+            trait_name: {value: tuple(rules) for value, rules in table.items()}
+            for trait_name, table in tables.items()
+        }
+
+    def check_constraints(self, normalized_options):
+        """
+        Returns a list of (trait name, error message) pairs for every constraint violated by the
+        normalized options. Only the rules for the current value of each governing trait are
+        looked up and checked.
+        """
+        violations = []
+        for governing_name, table in self._constraint_tables.items():
+            rules = table.get(normalized_options[governing_name], ())
+            for trait_name, check, message in rules:
+                if not check(normalized_options[trait_name]):
+                    violations.append((trait_name, message))
+        return violations
+
+    async def resolve_user_options(self, normalized_options, executor=None):
+        """
+        Returns a copy of the normalized options in which the value of each field with a resolver
+        is replaced by the result of that resolver. All resolvers run concurrently. Coroutine
+        resolvers run on the event loop, others run in the given executor.
+        """
+        if not self._resolvers:
+            return normalized_options
+        results = await asyncio.gather(*(
+            call_maybe_async(resolver, normalized_options[trait_name], executor=executor)
+            for trait_name, resolver in self._resolvers
+        ))
+        resolved_options = dict(normalized_options)
+        for (trait_name, _), result in zip(self._resolvers, results):
+            resolved_options[trait_name] = result
+        return resolved_options
+
+    async def validate_user_options(self, normalized_options, executor=None):
+        """
+        Runs the validators of every field against the normalized options concurrently, and
+        raises a ValueError listing the error of each field that was rejected.
+        """
+        if not self._validated_fields:
+            return
+        results = await asyncio.gather(*(
+            field.validate(normalized_options[field.trait_name], executor=executor)
+            for field in self._validated_fields
+        ))
+        errors = []
+        for field, error in zip(self._validated_fields, results):
+            if error is not None:
+                OPTIONS_VALIDATION_FAILURES.labels(field=field.trait_name, error='ValueError').inc()
+                errors.append('{}: {}'.format(field.label, error))
+        if errors:
+            raise ValueError('\n'.join(errors))
+
+    def validate_many(self, user_options_list):
+        """
+        Normalizes a batch of user options, e.g. a class roster before starting its servers.
+        The batch is processed one field at a time across all users. Returns a list with one
+        (normalized options, errors) pair per user options entry, in order. errors maps trait
+        names to error messages, including constraint violations of the constrained traits; when
+        it is not empty, normalized options is None.
+        """
+        rows = []
+        for user_options in user_options_list:
+            user_options = user_options or {}
+            errors = {}
+            is_json = not self.is_form_data(user_options)
+            if is_json:
+                for name in set(user_options).difference(self._trait_names):
+                    errors[name] = 'Unknown option.'
+            rows.append((user_options, {}, errors, is_json))
+        for (trait_name, normalize), (_, normalize_json) in zip(
+                self._normalization_plan, self._json_normalization_plan):
+            for user_options, normalized, errors, is_json in rows:
+                option = user_options.get(trait_name, None)
+                try:
+                    if is_json:
+                        normalized[trait_name] = normalize_json(option)
+                    else:
+                        normalized[trait_name] = normalize(option)
+                except ValueError as e:
+                    errors[trait_name] = str(e)
+        if self._constraint_tables:
+            for _, normalized, errors, _ in rows:
+                if errors:
+                    continue
+                for trait_name, message in self.check_constraints(normalized):
+                    if trait_name in errors:
+                        message = errors[trait_name] + '\n' + message
+                    errors[trait_name] = message
+        return [
+            (None, errors) if errors else (normalized, errors)
+            for _, normalized, errors, _ in rows
+        ]
+
+    def _check_json_option_names(self, user_options):
+        """Raises a ValueError if JSON user options name traits that are not in this form."""
+        unknown = set(user_options).difference(self._trait_names)
+        if unknown:
+            error_message = 'Unknown options: {}.'.format(', '.join(sorted(unknown)))
+            raise ValueError(error_message)
+
+    def _normalize_user_options(self, user_options, plan=None):
         normalized_options = {}
-        for field in self._fields:
-            trait_name = field.trait_name
-            option = user_options.get(trait_name, None)
-            normalized_option = field.normalize_user_option(option)
-            normalized_options[trait_name] = normalized_option
+        for trait_name, normalize in plan or self._normalization_plan:
+            try:
+                normalized_options[trait_name] = normalize(user_options.get(trait_name, None))
+            except Exception as e:
+                OPTIONS_VALIDATION_FAILURES.labels(field=trait_name, error=type(e).__name__).inc()
+                raise
         return normalized_options
 
 
@@ -53,20 +734,37 @@ class FormField(abc.ABC):
     """
 
     @abc.abstractmethod
-    def __init__(self, trait_name, label=None, **kwargs):
+    def __init__(self, trait_name, label=None, groups=None, resolver=None, validators=None,
+                 validator_ttl=60, fieldset=None, **kwargs):
         """
         This constructor will accept HTML5 input attributes as keyword arguments and
         apply them to the rendered field. These attributes must be prefixed by `attr`.
         Example: to specify an email input, provide `attr_type='email'` as a parameter.
+        If `groups` is given, the field is only shown to members of at least one of the
+        named JupyterHub groups. If `resolver` is given, it is called with the normalized
+        value when the spawner starts, and its result is assigned to the trait instead. It may
+        be a coroutine function for I/O bound work, other callables run in a thread pool.
+        `validators` are called the same way with the normalized value, and raise a ValueError
+        to reject it. Their outcome is cached per value for `validator_ttl` seconds.
+        `fieldset` names the group of fields this field is rendered in, see OptionsForm.
         """
         self._trait_name = trait_name
         self._label = label or trait_name
+        self._groups = frozenset(groups) if groups is not None else None
+        self._resolver = resolver
+        self._validators = tuple(validators or ())
+        self._validator_ttl = validator_ttl
+        self._validation_cache = TTLCache(validator_ttl, maxsize=1024)
+        self._fieldset = fieldset
         self._attributes = {}
         for key in [k for k in kwargs.keys() if k.startswith('attr_')]:
             attribute_name = key[5:]
             self._attributes[attribute_name] = kwargs.pop(key)
         if 'name' not in self._attributes:
             self._attributes['name'] = trait_name
+        self._rendered_attributes = None
+        self._compiled = None
+        self._spec = None
 
     @property
     def trait_name(self):
@@ -76,6 +774,22 @@ class FormField(abc.ABC):
     def label(self):
         return self._label
 
+    @property
+    def groups(self):
+        return self._groups
+
+    @property
+    def fieldset(self):
+        return self._fieldset
+
+    @property
+    def resolver(self):
+        return self._resolver
+
+    @property
+    def validators(self):
+        return self._validators
+
     @property
     def default_value(self):
         value = self._attributes.get('value', None)
@@ -86,11 +800,141 @@ class FormField(abc.ABC):
         required = self._attributes.get('required', False)
         return required
 
+    @property
+    def input_type(self):
+        """Returns the HTML input type of the field, or None for fields that are not inputs."""
+        return self._attributes.get('type', None)
+
+    @property
+    def dynamic(self):
+        """Returns True if the rendered output of this field can change after construction."""
+        return False
+
+    @property
+    def presets(self):
+        """
+        Returns a mapping of normalized values of this field to the bundles of other trait values
+        they set, or None if the field only sets its own trait.
+        """
+        return None
+
+    @property
+    def definition(self):
+        """
+        Returns a tuple of the values that fully define this field, used to fingerprint forms.
+        Subclasses with additional configuration should extend this tuple.
+        """
+        field_class = type(self)
+        return (
+            '{}.{}'.format(field_class.__module__, field_class.__qualname__),
+            self._trait_name,
+            self._label,
+            tuple(sorted(self._groups)) if self._groups is not None else None,
+            self._resolver,
+            self._validators,
+            self._validator_ttl,
+            tuple(sorted(self._attributes.items())),
+            self._fieldset,
+        )
+
+    def json_schema(self):
+        """
+        Returns the JSON Schema of the natively typed value of this field in JSON user options.
+        Subclasses should extend the returned schema with the type of their values.
+        """
+        schema = {'title': self.label}
+        if self.default_value is not None:
+            schema['default'] = self.default_value
+        return schema
+
+    def default_user_option(self):
+        """
+        Returns the option, in the shape of submitted form data, that normalizes to the default
+        value of the field. Used for fields whose inputs were never loaded into the form.
+        """
+        return None
+
+    def normalize_json_option(self, value):
+        """
+        Returns the normalized value for the field trait given a natively typed JSON value, as
+        submitted through the REST API. None stands for a missing value. Subclasses should
+        override this to check the type of the value instead of converting it.
+        """
+        return self.normalize_user_option(None if value is None else [value])
+
+    async def validate(self, value, executor=None):
+        """
+        Runs the validators of this field concurrently against a normalized value, and returns
+        the message of the first ValueError raised, in validator order, or None if the value is
+        valid. Outcomes are cached per (validator, value).
+        """
+        try:
+            hash(value)
+        except TypeError:
+            cacheable = False
+        else:
+            cacheable = True
+        errors = await asyncio.gather(*(
+            self._run_validator(validator, value, cacheable, executor)
+            for validator in self._validators
+        ))
+        return next((error for error in errors if error is not None), None)
+
+    async def _run_validator(self, validator, value, cacheable, executor):
+        key = (validator, value)
+        if cacheable and key in self._validation_cache:
+            return self._validation_cache.get(key)
+        try:
+            await call_maybe_async(validator, value, executor=executor)
+            error = None
+        except ValueError as e:
+            error = str(e)
+        if cacheable:
+            self._validation_cache.put(key, error)
+        return error
+
+    @property
+    def spec(self):
+        """
+        Returns the interned FieldSpec of this field. Fields are mutable and compare by identity,
+        so caches shared by identically defined fields are keyed on their specs instead.
+        """
+        if self._spec is None:
+            self._spec = FieldSpec(type(self), self._trait_name, self.definition)
+        return self._spec
+
+    def invalidate(self):
+        """
+        Discards the cached rendering and spec of this field, after its configuration has changed.
+        """
+        self._rendered_attributes = None
+        self._compiled = None
+        self._spec = None
+
+    def compile_version(self):
+        """
+        Returns the fragment identifying the version of this field that submissions are checked
+        against. Fields rendering state that may change between rendering and submission leave
+        it out.
+        """
+        return self.compile()
+
+    def compile(self):
+        """Returns the rendered field, rendering it only if the field changed since last time."""
+        if self._compiled is None:
+            self._compiled = self.render()
+        return self._compiled
+
     def _render_attribute_list(self):
         """
         Renders the field attributes in a format appropriate for direct insertion into
         a rendered for field.
         """
+        if self._rendered_attributes is None:
+            self._rendered_attributes = self._build_attribute_list()
+        return self._rendered_attributes
+
+    def _build_attribute_list(self):
         rendered_attributes = []
         for attribute in sorted(self._attributes.keys()):
             value = self._attributes[attribute]
@@ -22,6 +22,22 @@ class TextInputField(FormField):
     def __init__(self, *args, attr_type='text', **kwargs):
         """Defaults to a text input with no validation."""
         super().__init__(*args, attr_type=attr_type, **kwargs)
+        self._min_length = self._get_length_attribute('minlength')
+        self._max_length = self._get_length_attribute('maxlength')
+
+    def _get_length_attribute(self, attribute):
+        """Returns the value of a length attribute as an int, or None if it is not set."""
+        value = self._attributes.get(attribute, None)
+        return None if value is None else int(value)
+
+    def _check_length(self, value):
+        """Raises a ValueError if the value is outside of `attr_minlength` and `attr_maxlength`."""
+        if self._min_length is not None and len(value) < self._min_length:
+            error_message = '{} must be at least {} characters.'.format(self.label, self._min_length)
+            raise ValueError(error_message)
+        if self._max_length is not None and len(value) > self._max_length:
+            error_message = '{} must be at most {} characters.'.format(self.label, self._max_length)
+            raise ValueError(error_message)
 
     @property
     def default_value(self):
@@ -54,9 +70,9 @@ class TextInputField(FormField):
         """
         Returns the option as Unicode. Returns and empty string if handed an empty string or
         NoneType and no default has been set for the field. Raises a ValueError if this field is
-        required but empty.
+        required but empty, or if a value is outside of `attr_minlength` and `attr_maxlength`.
         """
-        value = option[0]
+        value = option[0] if option else None
         if not value:
             normalized_option = self.default_value
         elif not type(value) == str:
@@ -67,9 +83,33 @@ class TextInputField(FormField):
         if self.required and not normalized_option:
             error_message = 'Required field cannot be empty: {}.'.format(self.label)
             raise ValueError(error_message)
+        # As in browsers, the length of an empty value is not checked.
+        if normalized_option:
+            self._check_length(normalized_option)
 
         return normalized_option
 
+    def json_schema(self):
+        schema = super().json_schema()
+        schema['type'] = 'string'
+        if self._min_length is not None:
+            schema['minLength'] = self._min_length
+        if self._max_length is not None:
+            schema['maxLength'] = self._max_length
+        return schema
+
+    def normalize_json_option(self, value):
+        """
+        Returns the value if it is a string within the length bounds of the field, otherwise
+        raises a ValueError.
+        """
+        if value is not None and not isinstance(value, str):
+            error_message = 'Expected a string: {}'.format(value)
+            raise ValueError(error_message)
+        if value is not None:
+            self._check_length(value)
+        return self.normalize_user_option(None if value is None else [value])
+
 class NumericalInputField(TextInputField):
     """
     Form field for numerical inputs associated with either Integer or Float traits. This field
@@ -79,6 +119,14 @@ class NumericalInputField(TextInputField):
     def __init__(self, *args, attr_type='number', **kwargs):
         """Defaults to a numerical input with no validation."""
         super().__init__(*args, attr_type=attr_type, **kwargs)
+        self._value_type = float if self._is_float() else int
+        self._minimum = self._get_numerical_attribute('min')
+        self._maximum = self._get_numerical_attribute('max')
+
+    @property
+    def value_type(self):
+        """Returns the Python type of the normalized value, either int or float."""
+        return self._value_type
 
     @property
     def default_value(self):
@@ -87,6 +135,22 @@ class NumericalInputField(TextInputField):
             value = 0.0 if self._is_float() else 0
         return value
 
+    def _get_numerical_attribute(self, attribute):
+        """Returns the value of an attribute if it is a number, otherwise returns None."""
+        value = self._attributes.get(attribute, None)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        return value
+
+    def _check_bounds(self, value):
+        """Raises a ValueError if the value is outside of `attr_min` and `attr_max`."""
+        if self._minimum is not None and value < self._minimum:
+            error_message = '{} must be at least {}.'.format(self.label, self._minimum)
+            raise ValueError(error_message)
+        if self._maximum is not None and value > self._maximum:
+            error_message = '{} must be at most {}.'.format(self.label, self._maximum)
+            raise ValueError(error_message)
+
     def _is_float(self):
         """Returns True if the field represents a Float, otherwise returns False."""
         is_float = False
@@ -112,11 +176,11 @@ class NumericalInputField(TextInputField):
     def normalize_user_option(self, option):
         """
         Returns the option as either an Integer or a Float, dependent upon the traitlet
-        associated with this field. Raises a ValueError if the value cannot be converted.
+        associated with this field. Raises a ValueError if the value cannot be converted, or if
+        a submitted value is outside of the bounds of `attr_min` and `attr_max`.
         """
-        value = option[0]
-        traitlet = self.get_trait()
-        value_type = int if isinstance(traitlet, Integer) else float
+        value = option[0] if option else None
+        value_type = self._value_type
         if value == None or value == '':
             normalized_option = self.default_value
         elif not type(value) == value_type:
@@ -131,5 +195,35 @@ class NumericalInputField(TextInputField):
         if normalized_option == None and self.required:
             error_message = 'Required field cannot be empty: {}.'.format(self.label)
             raise ValueError(error_message)
+        # As in browsers, only submitted values are checked against the bounds.
+        if not (value == None or value == ''):
+            self._check_bounds(normalized_option)
+
+        return normalized_option
+
+    def json_schema(self):
+        schema = FormField.json_schema(self)
+        schema['type'] = 'number' if self._value_type is float else 'integer'
+        if self._minimum is not None:
+            schema['minimum'] = self._minimum
+        if self._maximum is not None:
+            schema['maximum'] = self._maximum
+        return schema
 
+    def normalize_json_option(self, value):
+        """
+        Returns the value as the Integer or Float of the trait. Raises a ValueError if it is not
+        a number, if an Integer is given a fractional number, or if it is outside of the bounds
+        of `attr_min` and `attr_max`.
+        """
+        if value is None:
+            return self.normalize_user_option(None)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            error_message = 'Expected a number: {}'.format(value)
+            raise ValueError(error_message)
+        if self._value_type is int and value != int(value):
+            error_message = 'Expected an integer: {}'.format(value)
+            raise ValueError(error_message)
+        normalized_option = self._value_type(value)
+        self._check_bounds(normalized_option)
         return normalized_option
@@ -84,3 +84,30 @@ class CheckboxInputField(FormField):
         else:
             normalized = value if is_checked else ''
         return normalized
+
+    def default_user_option(self):
+        """Returns the option of a checked checkbox if it is checked by default."""
+        return ['on'] if self._attributes.get('checked', False) else None
+
+    def json_schema(self):
+        schema = super().json_schema()
+        value = self._attributes.get('value', True)
+        if type(value) == bool:
+            schema['type'] = 'boolean'
+        else:
+            schema['type'] = 'string'
+            schema['enum'] = [value, '']
+        return schema
+
+    def normalize_json_option(self, value):
+        """
+        Returns the normalized value of a checkbox given true, false, or for a checkbox with an
+        `attr_value`, that value or an empty string. Raises a ValueError for other values.
+        """
+        checkbox_value = self._attributes.get('value', True)
+        if value is None or value is False or value == '':
+            return self.normalize_user_option(None)
+        if value is True or (type(checkbox_value) != bool and value == checkbox_value):
+            return self.normalize_user_option(['on'])
+        error_message = 'Invalid checkbox value: {}'.format(value)
+        raise ValueError(error_message)
@@ -0,0 +1,82 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Boulder Research Computing
+
+
+
+class FieldConstraint:
+    """
+    A declarative rule restricting the values of other fields while the field `trait_name` has
+    the normalized value `value`. Each keyword argument maps trait names to a bound:
+    * minimum: the smallest value allowed for each trait.
+    * maximum: the largest value allowed for each trait.
+    * allowed: an iterable of the only values allowed for each trait.
+
+    Example: `FieldConstraint('partition', 'debug', maximum={'cores': 2, 'hours': 1})`.
+    Constraints are immutable, and compare and hash by value.
+    """
+
+    __slots__ = ('trait_name', 'value', 'minimum', 'maximum', 'allowed', '_hash')
+
+    def __init__(self, trait_name, value, minimum=None, maximum=None, allowed=None):
+        bounds = {
+            'trait_name': trait_name,
+            'value': value,
+            'minimum': tuple(sorted((minimum or {}).items())),
+            'maximum': tuple(sorted((maximum or {}).items())),
+            'allowed': tuple(sorted(
+                (name, frozenset(values)) for name, values in (allowed or {}).items()
+            )),
+        }
+        if not (bounds['minimum'] or bounds['maximum'] or bounds['allowed']):
+            raise ValueError('A constraint requires at least one minimum, maximum or allowed bound.')
+        for name, bound in bounds.items():
+            object.__setattr__(self, name, bound)
+        object.__setattr__(self, '_hash', hash(self.definition))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('FieldConstraint is immutable.')
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, FieldConstraint):
+            return NotImplemented
+        return self.definition == other.definition
+
+    def __repr__(self):
+        return '{}({!r}, {!r})'.format(type(self).__name__, self.trait_name, self.value)
+
+    @property
+    def definition(self):
+        return (self.trait_name, self.value, self.minimum, self.maximum, self.allowed)
+
+    @property
+    def trait_names(self):
+        """Returns the names of the governing trait and of every trait it constrains."""
+        names = {self.trait_name}
+        for bounds in (self.minimum, self.maximum, self.allowed):
+            names.update(name for name, _ in bounds)
+        return frozenset(names)
+
+    def compile(self, labels):
+        """
+        Returns a (trait name, check, error message) rule for each bound, given the labels of
+        the form fields by trait name. check is called with the normalized value of the trait
+        and returns False if the bound is violated. Raises a ValueError for unknown traits.
+        """
+        unknown = sorted(self.trait_names.difference(labels))
+        if unknown:
+            raise ValueError('Constraint on unknown form fields: {}.'.format(', '.join(unknown)))
+        condition = 'when {} is {}'.format(labels[self.trait_name], self.value)
+        rules = []
+        for name, minimum in self.minimum:
+            message = '{} must be at least {} {}.'.format(labels[name], minimum, condition)
+            rules.append((name, lambda value, minimum=minimum: value >= minimum, message))
+        for name, maximum in self.maximum:
+            message = '{} must be at most {} {}.'.format(labels[name], maximum, condition)
+            rules.append((name, lambda value, maximum=maximum: value <= maximum, message))
+        for name, allowed in self.allowed:
+            message = '{} must be one of {} {}.'.format(
+                labels[name], ', '.join(sorted(str(value) for value in allowed)), condition)
+            rules.append((name, allowed.__contains__, message))
+        return rules
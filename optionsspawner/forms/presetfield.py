@@ -0,0 +1,74 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Boulder Research Computing
+
+from .selectfield import SelectField
+
+
+
+class FrozenTraitValues(dict):
+    """
+    A read-only dict of trait values. Unlike a mappingproxy, it can be copied along with the
+    configuration holding it.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Preset trait values are read-only.')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+
+class PresetField(SelectField):
+    """
+    Form field selecting one of several presets, each of which sets a bundle of spawner trait
+    values at once, e.g. the memory, cores and image of a "GPU" profile. The name of the selected
+    preset is assigned to the field trait, and the values of its bundle to their traits. Takes
+    two special keyword arguments in addition to HTML attributes:
+    * presets: list of (name, label, trait values) tuples, where trait values is a dict of the
+               values to assign to spawner traits, by trait name.
+    * default: the name of the preset selected by default. If no default defined, the first
+               preset will be selected.
+
+    Bundles are validated and frozen when the field is created, and must not be modified.
+    """
+
+    def __init__(self, *args, presets=[], **kwargs):
+        kwargs.pop('choices', None)
+        self._presets = self._freeze_presets(presets)
+        choices = [(name, label) for name, label, _ in presets]
+        super().__init__(*args, choices=choices, **kwargs)
+
+    @staticmethod
+    def _freeze_presets(presets):
+        """
+        Returns a read-only dict of preset names to read-only trait value bundles. Raises a
+        ValueError if a bundle is empty or names anything but a trait.
+        """
+        frozen = {}
+        for name, label, trait_values in presets:
+            if not trait_values:
+                raise ValueError('Preset {} does not set any trait values.'.format(name))
+            for trait_name in trait_values:
+                if not isinstance(trait_name, str) or not trait_name.isidentifier():
+                    raise ValueError('Invalid trait name in preset {}: {!r}'.format(name, trait_name))
+            frozen[name] = FrozenTraitValues(trait_values)
+        return FrozenTraitValues(frozen)
+
+    @property
+    def presets(self):
+        return self._presets
+
+    @property
+    def definition(self):
+        presets = tuple(
+            (name, tuple(sorted(trait_values.items()))) for name, trait_values in self._presets.items()
+        )
+        return super().definition + (presets,)
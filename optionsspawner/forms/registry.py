@@ -0,0 +1,74 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Boulder Research Computing
+
+"""
+Registry of form field types by name. Third party packages register field types with an entry
+point in the `optionsspawner.fields` group, e.g. in setup.py:
+
+    entry_points={'optionsspawner.fields': ['slider = mypackage.fields:SliderField']}
+
+A field type is only imported once a configuration refers to its name.
+"""
+
+import importlib
+import importlib.metadata
+
+
+ENTRY_POINT_GROUP = 'optionsspawner.fields'
+
+# Field types shipped with this package, so they resolve without scanning entry points.
+_builtin_field_types = {
+    'text': 'optionsspawner.forms.characterfield:TextInputField',
+    'numerical': 'optionsspawner.forms.characterfield:NumericalInputField',
+    'checkbox': 'optionsspawner.forms.checkboxfield:CheckboxInputField',
+    'select': 'optionsspawner.forms.selectfield:SelectField',
+    'preset': 'optionsspawner.forms.presetfield:PresetField',
+}
+
+# Field classes loaded so far, by field type name.
+_field_classes = {}
+
+
+def _load(reference):
+    module_name, _, class_name = reference.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def _find_entry_point(name):
+    entry_points = importlib.metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        matches = entry_points.select(group=ENTRY_POINT_GROUP, name=name)
+    else:
+        matches = [ep for ep in entry_points.get(ENTRY_POINT_GROUP, []) if ep.name == name]
+    return next(iter(matches), None)
+
+
+def get_field_class(name):
+    """
+    Returns the form field class registered under a type name, importing it on first use.
+    Raises a ValueError if no field type is registered under the name.
+    """
+    field_class = _field_classes.get(name)
+    if field_class is None:
+        if name in _builtin_field_types:
+            field_class = _load(_builtin_field_types[name])
+        else:
+            entry_point = _find_entry_point(name)
+            if entry_point is None:
+                raise ValueError('Unknown form field type: {}'.format(name))
+            field_class = entry_point.load()
+        _field_classes[name] = field_class
+    return field_class
+
+
+def create_field(definition):
+    """
+    Returns a form field built from a dict, holding the field type name under `type`, and the
+    constructor arguments of the field. Example:
+    `{'type': 'select', 'trait_name': 'partition', 'choices': [('debug', 'Debug')]}`
+    """
+    arguments = dict(definition)
+    try:
+        name = arguments.pop('type')
+    except KeyError:
+        raise ValueError('Form field definitions require a type: {!r}'.format(definition))
+    return get_field_class(name)(**arguments)
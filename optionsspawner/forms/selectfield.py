@@ -1,10 +1,12 @@
 # Copyright (c) 2018, Zebula Sampedro, CU Boulder Research Computing
 
+import bisect
 from traitlets import (
     Unicode,
     Integer,
     Float,
 )
+from ..utils import RefreshingCache
 from .base import FormField
 
 
@@ -16,6 +18,16 @@ class SelectField(FormField):
     * choices: tuple of (value, label) pairs that the rendered select options will represent.
     * default: the value of the choice selected by default. If no default defined, the first
                choice will be selected.
+    * choices_ttl: when choices is a callable, the number of seconds its result is cached for.
+    * searchable: if True, render a text input with typeahead suggestions served by
+                  `optionsspawner.handlers.SelectFieldSearchHandler` instead of inlining every
+                  choice in the form. Intended for fields with thousands of choices.
+    * capacity: a sync or async callable returning a dict of the free capacity of choice values,
+                e.g. idle nodes per partition. The choice with the most free capacity is
+                preselected when the form is rendered, and choices without free capacity are
+                marked as full.
+    * capacity_ttl: the number of seconds the result of the capacity callable is cached for.
+    * disable_full: if True, choices marked as full are rendered disabled.
 
     NOTE: `attr_value` should not be specified on this field, and will have no effect.
     """
@@ -25,39 +37,270 @@ class SelectField(FormField):
     """{options}"""
     """</select>\n""")
 
-    option_template = ("""<option id="id_{trait_name}_option_{enumeration}" value="{value}"{selected}>{display}</option>\n""")
+    option_template = ("""<option id="id_{trait_name}_option_{enumeration}" value="{value}"{selected}{disabled}>{display}</option>\n""")
 
-    def __init__(self, *args, choices=[], default=None, **kwargs):
+    full_choice_template = '{display} (full)'
+
+    search_template = ("""<label for="{trait_name}">{label}</label>\n"""
+    """<input id="id_{trait_name}" class="form-control" autocomplete="off" list="id_{trait_name}_choices" value="{value}" {attributes}>\n"""
+    """<datalist id="id_{trait_name}_choices"></datalist>\n"""
+    """<script>{script}</script>\n""")
+
+    # The search handler is served by JupyterHub relative to the hub base URL.
+    search_script_template = ("""(function () {{"""
+    """var input = document.getElementById("id_{trait_name}");"""
+    """var choices = document.getElementById("id_{trait_name}_choices");"""
+    """var url = window.jhdata.base_url + "options/search/{trait_name}?q=";"""
+    """input.addEventListener("input", function () {{"""
+    """fetch(url + encodeURIComponent(input.value), {{credentials: "same-origin"}})"""
+    """.then(function (response) {{ return response.json(); }})"""
+    """.then(function (matches) {{"""
+    """choices.innerHTML = "";"""
+    """matches.forEach(function (match) {{"""
+    """var option = document.createElement("option");"""
+    """option.value = match.value;"""
+    """option.textContent = match.label;"""
+    """choices.appendChild(option);"""
+    """}});"""
+    """}});"""
+    """}});"""
+    """}})();""")
+
+    def __init__(self, *args, choices=[], default=None, searchable=False, choices_ttl=300,
+                 initial_choices=None, capacity=None, capacity_ttl=30, initial_capacity=None,
+                 disable_full=True, **kwargs):
         """
-        All choices must be of the same type.
+        All choices must be of the same type. `choices` may also be a sync or async callable
+        returning the choices, which is cached for `choices_ttl` seconds and refreshed in the
+        background. Sync callables are called once here unless `initial_choices` are given,
+        async callables require `initial_choices`. The `capacity` callable is cached the same
+        way, with `initial_capacity`. Capacity only affects the rendered form, submissions of
+        full choices are still accepted.
         """
         kwargs.pop('attr_value', None)
         # Multiselection isn't supported yet.
         kwargs.pop('attr_multiple', None)
-        self._choices = choices
-        choice_values = [choice[0] for choice in choices]
+        self._searchable = searchable
+        self._default = default
+        self._value_type = None
+        self._choices_cache = None
+        self._disable_full = disable_full
+        self._capacity = None
+        self._capacity_cache = None
+        if capacity is not None:
+            self._capacity_cache = RefreshingCache(capacity, capacity_ttl,
+                initial=initial_capacity,
+                validate=self._check_capacity
+            )
+            self._capacity = self._capacity_cache.get()
+        if callable(choices):
+            self._choices_cache = RefreshingCache(choices, choices_ttl,
+                initial=initial_choices,
+                validate=self._check_choices
+            )
+            choices = self._choices_cache.get()
+        self._provided_choices = choices
+        self._set_choices(choices)
+        super().__init__(*args, **kwargs)
 
+    @staticmethod
+    def _get_value_type(value):
+        value_type = str
+        if isinstance(value, int):
+            value_type = int
+        elif isinstance(value, float):
+            value_type = float
+        return value_type
+
+    def _check_choices(self, choices):
+        """
+        Raises a ValueError or TypeError if the choices are empty, not unique, of mixed types,
+        or of a different type than the choices this field was created with.
+        """
+        choice_values = [choice[0] for choice in choices]
+        if not choice_values:
+            raise ValueError('At least one choice is required.')
         if len(set(choice_values)) < len(choice_values):
             raise ValueError('All choice values must be unique.')
         if len(set(type(val) for val in choice_values)) > 1:
             raise TypeError('All types in select options must be the same.')
+        value_type = self._get_value_type(choice_values[0])
+        if self._value_type is not None and value_type is not self._value_type:
+            raise TypeError('Choice values must remain of type {}.'.format(self._value_type))
 
-        self._default_value = default if default in choice_values else choice_values[0]
-        super().__init__(*args, **kwargs)
+    @staticmethod
+    def _check_capacity(capacity):
+        """Raises a TypeError if the capacity is not a dict of choice values to numbers."""
+        if not isinstance(capacity, dict):
+            raise TypeError('Capacity must be a dict of choice values to free capacity.')
+
+    def _refresh_capacity(self):
+        """Applies the latest capacity from the capacity callable, if it has changed."""
+        if self._capacity_cache is None:
+            return
+        capacity = self._capacity_cache.get()
+        if capacity is not self._capacity:
+            self._capacity = capacity
+            self._select_choice()
+            self._compiled = None
+
+    def _select_choice(self):
+        """
+        Selects the choice with the most free capacity, the first one on ties, and collects the
+        choices without free capacity. The default choice is selected if no capacity is known.
+        """
+        capacity = self._capacity or {}
+        selected_value = self._default_value
+        most_free = None
+        full_values = set()
+        for value, _ in self._choices:
+            free = capacity.get(value, None)
+            if free is None:
+                continue
+            if free <= 0:
+                full_values.add(value)
+            elif most_free is None or free > most_free:
+                most_free = free
+                selected_value = value
+        self._selected_value = selected_value
+        self._full_values = frozenset(full_values)
+
+    def _refresh_choices(self):
+        """Applies the latest choices from a choices callable, if they have changed."""
+        if self._choices_cache is None:
+            return
+        choices = self._choices_cache.get()
+        if choices is not self._provided_choices:
+            self._provided_choices = choices
+            self._set_choices(choices)
+
+    def _set_choices(self, choices):
+        """
+        Validates the choices and builds the frozen choice index: the value to label map, the
+        set of typed values used for validation and the position of each value in the list.
+        """
+        self._check_choices(choices)
+        choices = tuple(tuple(choice) for choice in choices)
+        choice_labels = dict(choices)
+
+        self._value_type = self._get_value_type(choices[0][0])
+        self._default_value = self._default if self._default in choice_labels else choices[0][0]
+        self._choices = choices
+        self._choice_labels = choice_labels
+        self._choice_values = frozenset(choice_labels)
+        self._choice_positions = {value: i for i, (value, _) in enumerate(choices)}
+        # Built on the first search, so only searched fields pay for it.
+        self._search_keys = None
+        self._search_index = None
+        self._select_choice()
+        self._compiled = None
+        self._compiled_version = None
 
     @property
     def default_value(self):
         return self._default_value
 
-    def _render_options(self, choices):
+    @property
+    def selected_value(self):
+        """Returns the value of the choice preselected in the rendered form."""
+        self._refresh_capacity()
+        return self._selected_value
+
+    @property
+    def value_type(self):
+        """Returns the Python type of the choice values, one of str, int or float."""
+        return self._value_type
+
+    @property
+    def searchable(self):
+        return self._searchable
+
+    @property
+    def dynamic(self):
+        return self._choices_cache is not None or self._capacity_cache is not None
+
+    @property
+    def definition(self):
+        if self._choices_cache is not None:
+            # Identify dynamic choices by their provider, not the currently cached choices.
+            choices = (self._choices_cache.provider, self._choices_cache.ttl)
+        else:
+            choices = self._choices
+        capacity = None
+        if self._capacity_cache is not None:
+            capacity = (self._capacity_cache.provider, self._capacity_cache.ttl, self._disable_full)
+        return super().definition + (choices, self._default, self._searchable, capacity)
+
+    def compile(self):
+        self._refresh_choices()
+        self._refresh_capacity()
+        return super().compile()
+
+    def _build_search_index(self):
+        """
+        Builds a sorted index of the lowercased labels and values of the choices, each paired
+        with the position of its choice, so prefix queries can be answered by binary search.
+        """
+        index = []
+        search_keys = []
+        for i, (value, display) in enumerate(self._choices):
+            label_key = str(display).lower()
+            value_key = str(value).lower()
+            index.append((label_key, i))
+            index.append((value_key, i))
+            search_keys.append('{} {}'.format(label_key, value_key))
+        index.sort()
+        self._search_index = index
+        self._search_keys = search_keys
+
+    def search(self, query, limit=20):
+        """
+        Returns up to `limit` (value, label) choices matching the query, in choice order.
+        Choices with a label or value starting with the query are found in the sorted index,
+        and any remaining room is filled with choices containing the query. Returns no choices
+        if `limit` is not positive.
+        """
+        if limit <= 0:
+            return []
+        self._refresh_choices()
+        if self._search_index is None:
+            self._build_search_index()
+        query = query.strip().lower()
+        if not query:
+            return list(self._choices[:limit])
+
+        positions = set()
+        index = self._search_index
+        i = bisect.bisect_left(index, (query, -1))
+        while i < len(index) and len(positions) < limit:
+            key, position = index[i]
+            if not key.startswith(query):
+                break
+            positions.add(position)
+            i += 1
+        if len(positions) < limit:
+            for position, key in enumerate(self._search_keys):
+                if query in key:
+                    positions.add(position)
+                    if len(positions) >= limit:
+                        break
+        return [self._choices[position] for position in sorted(positions)]
+
+    def _render_options(self, choices, selected_value, full_values):
         rendered_options = []
-        for i in range(len(self._choices)):
-            value, display = self._choices[i]
-            selected = ' selected' if value == self.default_value else ''
+        selected_position = self._choice_positions[selected_value]
+        for i, (value, display) in enumerate(choices):
+            selected = ' selected' if i == selected_position else ''
+            disabled = ''
+            if value in full_values:
+                display = self.full_choice_template.format(display=display)
+                if self._disable_full and not selected:
+                    disabled = ' disabled'
             rendered_option = self.option_template.format(
                 value=value,
                 display=display,
                 selected=selected,
+                disabled=disabled,
                 trait_name=self.trait_name,
                 enumeration=i
             )
@@ -66,8 +309,22 @@ class SelectField(FormField):
         return ''.join(rendered_options)
 
     def render(self):
-        rendered_options = self._render_options(self._choices)
+        self._refresh_choices()
+        self._refresh_capacity()
+        return self._render(self._selected_value, self._full_values)
+
+    def _render(self, selected_value, full_values):
         attributes = self._render_attribute_list()
+        if self._searchable:
+            script = self.search_script_template.format(trait_name=self.trait_name)
+            return self.search_template.format(
+                trait_name=self.trait_name,
+                label=self.label,
+                value=selected_value,
+                attributes=attributes,
+                script=script
+            )
+        rendered_options = self._render_options(self._choices, selected_value, full_values)
         rendered_select = self.select_template.format(
             trait_name=self.trait_name,
             label=self.label,
@@ -76,16 +333,31 @@ class SelectField(FormField):
         )
         return rendered_select
 
+    def compile_version(self):
+        """
+        Returns the field rendered without capacity annotations, with the default choice
+        selected, so capacity refreshes leave the version of the form unchanged.
+        """
+        if self._capacity_cache is None:
+            return self.compile()
+        self._refresh_choices()
+        if self._compiled_version is None:
+            self._compiled_version = self._render(self._default_value, frozenset())
+        return self._compiled_version
+
+    def invalidate(self):
+        super().invalidate()
+        self._compiled_version = None
+
     def get_trait(self):
         """
         Returns one of Unicode, Integer, or Float traits dependent upon the type of the field
         choices.
         """
         trait_class = Unicode
-        value, _ = self._choices[0]
-        if isinstance(value, int):
+        if self._value_type is int:
             trait_class = Integer
-        elif isinstance(value, float):
+        elif self._value_type is float:
             trait_class = Float
 
         trait_kwargs = {}
@@ -97,19 +369,42 @@ class SelectField(FormField):
 
         return trait
 
+    def json_schema(self):
+        schema = super().json_schema()
+        schema['type'] = {str: 'string', int: 'integer', float: 'number'}[self._value_type]
+        schema['enum'] = [value for value, _ in self._choices]
+        return schema
+
+    def normalize_json_option(self, value):
+        """
+        Returns the value if it is one of the choices, or the default choice for None. Raises a
+        ValueError if the value is not of the type of the choices, or not present in the choice
+        list. Integers are accepted for Float choices.
+        """
+        self._refresh_choices()
+        if value is None:
+            return self.default_value
+        value_type = self._value_type
+        if type(value) is not value_type and not (value_type is float and type(value) is int):
+            error_message = 'Expected {}: {}'.format(value_type, value)
+            raise ValueError(error_message)
+        if value not in self._choice_values:
+            error_message = 'Invalid selection: {}'.format(value)
+            raise ValueError(error_message)
+        return value_type(value)
+
     def normalize_user_option(self, option):
         """
         Returns the option as a Unicode, Integer, or Float, dependent upon the traitlet
         associated with this field. Raises a ValueError if the value cannot be converted, or
-        if the selection is not present in the choice list.
+        if the selection is not present in the choice list. Returns the default choice if no
+        selection was submitted.
         """
+        self._refresh_choices()
+        if not option:
+            return self.default_value
         value = option[0]
-        traitlet = self.get_trait()
-        value_type = str
-        if isinstance(traitlet, Integer):
-            value_type = int
-        elif isinstance(traitlet, Float):
-            value_type = float
+        value_type = self._value_type
 
         try:
             selection = value_type(value)
@@ -117,8 +412,7 @@ class SelectField(FormField):
             error_message = 'Cannot convert to {}: {}'.format(value_type, value)
             raise ValueError(error_message)
 
-        choice_values = [choice[0] for choice in self._choices]
-        if selection not in choice_values:
+        if selection not in self._choice_values:
             error_message = 'Invalid selection: {}'.format(selection)
             raise ValueError(error_message)
 
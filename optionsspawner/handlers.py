@@ -0,0 +1,131 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Boulder Research Computing
+
+"""
+Hub request handlers backing interactive options form fields.
+"""
+
+import json
+from tornado import web
+from jupyterhub.handlers import BaseHandler
+from .optionsspawner import get_form_fields
+
+
+
+class SelectFieldSearchHandler(BaseHandler):
+    """
+    Answers typeahead queries for searchable SelectFields with a JSON list of
+    {"value": ..., "label": ...} matches. Register it with the hub using `route`:
+
+        c.JupyterHub.extra_handlers = [SelectFieldSearchHandler.route(form_fields)]
+    """
+
+    # Must match the URL requested by SelectField.search_script_template.
+    url_pattern = r'/options/search/([^/]+)'
+    default_limit = 20
+    max_limit = 100
+
+    @classmethod
+    def route(cls, form_fields):
+        """
+        Returns an extra_handlers entry serving the searchable fields in form_fields, which may
+        be given as fields or field definitions, as in `OptionsFormSpawner.form_fields`.
+        """
+        searchable_fields = {
+            field.trait_name: field for field in get_form_fields(form_fields)
+            if getattr(field, 'searchable', False)
+        }
+        return (cls.url_pattern, cls, {'searchable_fields': searchable_fields})
+
+    def initialize(self, searchable_fields):
+        self._searchable_fields = searchable_fields
+
+    @web.authenticated
+    def get(self, trait_name):
+        field = self._searchable_fields.get(trait_name)
+        if field is None:
+            raise web.HTTPError(404)
+        query = self.get_argument('q', '')
+        try:
+            limit = int(self.get_argument('limit', self.default_limit))
+        except ValueError:
+            raise web.HTTPError(400, 'limit must be an integer')
+        if limit < 1:
+            raise web.HTTPError(400, 'limit must be at least 1')
+        limit = min(limit, self.max_limit)
+        matches = [{'value': value, 'label': label} for value, label in field.search(query, limit)]
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps(matches))
+
+
+class OptionsSchemaHandler(BaseHandler):
+    """
+    Serves the JSON Schema of the user options accepted by the current user's spawner, so
+    REST API clients can build natively typed user_options without reading the HTML form.
+    Register it with the hub using `route`:
+
+        c.JupyterHub.extra_handlers = [OptionsSchemaHandler.route()]
+
+    The schema of a named server is served at options/schema/<server name>.
+    """
+
+    url_pattern = r'/options/schema(?:/([^/]+))?'
+
+    @classmethod
+    def route(cls):
+        """Returns an extra_handlers entry serving the options schema."""
+        return (cls.url_pattern, cls)
+
+    @web.authenticated
+    def get(self, server_name=None):
+        # Looking up an unknown name in spawners would create a spawner for it, or fail.
+        if server_name and server_name not in self.current_user.orm_spawners:
+            raise web.HTTPError(404)
+        spawner = self.current_user.spawners[server_name or '']
+        schema = getattr(spawner, 'options_json_schema', None)
+        if schema is None:
+            raise web.HTTPError(404)
+        self.set_header('Content-Type', 'application/schema+json')
+        self.finish(json.dumps(schema))
+
+
+class OptionsFieldsetHandler(BaseHandler):
+    """
+    Serves the fields of a collapsed fieldset of the current user's options form, when the
+    fieldset is opened. Register it with the hub using `route`:
+
+        c.JupyterHub.extra_handlers = [OptionsFieldsetHandler.route()]
+
+    Responses requested with the current version of the fieldset may be cached by the browser.
+    """
+
+    # Must match the URL requested by OptionsForm.fieldset_script.
+    url_pattern = r'/options/fieldset/([^/]+)'
+    cache_max_age = 24 * 60 * 60
+
+    @classmethod
+    def route(cls):
+        """Returns an extra_handlers entry serving collapsed fieldsets."""
+        return (cls.url_pattern, cls)
+
+    @web.authenticated
+    def get(self, name):
+        spawner = self.current_user.spawners['']
+        compile_fieldset = getattr(spawner, 'compile_options_fieldset', None)
+        compiled = compile_fieldset(name) if compile_fieldset else None
+        if compiled is None:
+            raise web.HTTPError(404)
+        self.set_header('Content-Type', 'text/html; charset=UTF-8')
+        self.set_header('ETag', '"{}"'.format(compiled.digest))
+        self.set_header('Vary', 'Accept-Encoding')
+        if self.get_argument('v', None) == compiled.digest:
+            self.set_header('Cache-Control', 'private, max-age={}'.format(self.cache_max_age))
+        else:
+            self.set_header('Cache-Control', 'no-cache')
+        body = compiled.html_bytes
+        if 'gzip' in self.request.headers.get('Accept-Encoding', ''):
+            # Only large fieldsets have a compressed copy, compressed once per version.
+            gzipped = compiled.gzipped
+            if gzipped is not None:
+                self.set_header('Content-Encoding', 'gzip')
+                body = gzipped
+        self.finish(body)
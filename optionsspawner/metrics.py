@@ -0,0 +1,102 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Boulder Research Computing
+
+"""
+Prometheus metrics for the options spawner.
+
+Metrics are registered in the default prometheus_client registry, which JupyterHub serves
+at /hub/metrics alongside its own metrics. If prometheus_client is not installed, every
+metric is a no-op.
+"""
+
+import contextlib
+
+try:
+    from prometheus_client import (
+        Counter,
+        Gauge,
+        Histogram,
+    )
+except ImportError:
+    Counter = Gauge = Histogram = None
+
+
+
+class NoopMetric:
+    """Stands in for a prometheus_client metric when prometheus_client is unavailable."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, amount):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def time(self):
+        return contextlib.nullcontext()
+
+
+def histogram(name, documentation, **kwargs):
+    if Histogram is None:
+        return NoopMetric()
+    return Histogram(name, documentation, **kwargs)
+
+
+def counter(name, documentation, **kwargs):
+    if Counter is None:
+        return NoopMetric()
+    return Counter(name, documentation, **kwargs)
+
+
+def gauge(name, documentation, **kwargs):
+    if Gauge is None:
+        return NoopMetric()
+    return Gauge(name, documentation, **kwargs)
+
+
+OPTIONS_FORM_RENDER_DURATION_SECONDS = histogram(
+    'optionsspawner_form_render_duration_seconds',
+    'Time taken to render the options form',
+)
+
+OPTIONS_FROM_FORM_DURATION_SECONDS = histogram(
+    'optionsspawner_options_from_form_duration_seconds',
+    'Time taken to parse user options from submitted form data',
+)
+
+OPTIONS_NORMALIZE_DURATION_SECONDS = histogram(
+    'optionsspawner_normalize_duration_seconds',
+    'Time taken to normalize user options for the form field traits',
+)
+
+OPTIONS_CONSTRUCT_CHILD_DURATION_SECONDS = histogram(
+    'optionsspawner_construct_child_duration_seconds',
+    'Time taken to construct the child spawner and apply the form field traits',
+)
+
+OPTIONS_CHILD_START_DURATION_SECONDS = histogram(
+    'optionsspawner_child_start_duration_seconds',
+    'Time taken by the child spawner start',
+)
+
+OPTIONS_VALIDATION_FAILURES = counter(
+    'optionsspawner_validation_failures',
+    'Number of user options rejected during normalization, by field and error type',
+    labelnames=['field', 'error'],
+)
+
+OPTIONS_ADMISSION_QUEUE_DEPTH = gauge(
+    'optionsspawner_admission_queue_depth',
+    'Number of spawns waiting to be admitted, by field and option value',
+    labelnames=['field', 'value'],
+)
+
+OPTIONS_ADMISSION_WAIT_DURATION_SECONDS = histogram(
+    'optionsspawner_admission_wait_duration_seconds',
+    'Time spawns waited to be admitted, by field',
+    labelnames=['field'],
+)
@@ -4,12 +4,19 @@
 Options Form Spawner
 """
 
+import asyncio
+import concurrent.futures
 import traitlets
 from traitlets.config import LoggingConfigurable
 from traitlets import (
     Unicode,
+    Integer,
+    Float,
+    Bool,
     List,
+    Dict,
     Instance,
+    Union,
 )
 import tornado
 import wrapspawner
@@ -17,9 +24,142 @@ import wrapspawner
 from .forms import (
     OptionsForm,
     FormField,
+    FieldConstraint,
+    create_field,
 )
+from .admission import AdmissionController
+from .store import OptionsStore
+from .metrics import (
+    OPTIONS_FORM_RENDER_DURATION_SECONDS,
+    OPTIONS_FROM_FORM_DURATION_SECONDS,
+    OPTIONS_NORMALIZE_DURATION_SECONDS,
+    OPTIONS_CONSTRUCT_CHILD_DURATION_SECONDS,
+    OPTIONS_CHILD_START_DURATION_SECONDS,
+)
+
+
+# Form fields built from dict definitions, keyed by the representation of the definition, so
+# spawners configured with the same definitions share the same field instances.
+_defined_fields = {}
+
+
+def get_form_fields(form_fields):
+    """
+    Returns the form fields of a form_fields configuration, building each dict definition with
+    the field type registry. Other entries are returned as is.
+    """
+    fields = []
+    for field in form_fields:
+        if isinstance(field, dict):
+            key = repr(sorted(field.items(), key=lambda item: item[0]))
+            defined_field = _defined_fields.get(key)
+            if defined_field is None:
+                defined_field = create_field(field)
+                _defined_fields[key] = defined_field
+            field = defined_field
+        fields.append(field)
+    return fields
+
+
+# Compiled options forms shared by every spawner instance in the process, keyed by the specs
+# of their fields, their constraints, collapsed fieldsets and variant cache size. Each entry is an (OptionsForm, rendered form) pair.
+_options_form_cache = {}
+
+
+def get_compiled_options_form(form_fields, variant_cache_size=32, constraints=(),
+                              collapsed_fieldsets=None):
+    """
+    Returns an (OptionsForm, rendered form) pair for a list of form fields, constraints and
+    collapsed fieldsets. Forms are built and rendered once per distinct configuration and reused
+    by all subsequent callers.
+    """
+    key = (
+        tuple(field.spec for field in form_fields),
+        tuple(constraints),
+        tuple(sorted((collapsed_fieldsets or {}).items())),
+        variant_cache_size,
+    )
+    compiled = _options_form_cache.get(key)
+    if compiled is None:
+        options_form = OptionsForm(form_fields,
+            variant_cache_size=variant_cache_size,
+            constraints=constraints,
+            collapsed_fieldsets=collapsed_fieldsets
+        )
+        with OPTIONS_FORM_RENDER_DURATION_SECONDS.time():
+            rendered_options_form = options_form.render_versioned()
+        compiled = (options_form, rendered_options_form)
+        _options_form_cache[key] = compiled
+    return compiled
+
+
+# Spawner subclasses carrying the traits of an options form, keyed by (base class, form
+# fingerprint), so the number of generated classes does not grow with the number of spawners.
+_trait_class_cache = {}
+
+
+def get_trait_class(base_class, options_form):
+    """
+    Returns a subclass of base_class with a trait added for each field of the options form.
+    This mirrors HasTraits.add_traits, but reuses the generated class for identical inputs.
+    """
+    fingerprint = options_form.fingerprint
+    trait_class = _trait_class_cache.get((base_class, fingerprint))
+    if trait_class is None:
+        attrs = {
+            '__module__': base_class.__module__,
+            '__qualname__': base_class.__qualname__,
+        }
+        attrs.update({field.trait_name: field.get_trait() for field in options_form.fields})
+        trait_class = type(base_class.__name__, (base_class,), attrs)
+        _trait_class_cache[(base_class, fingerprint)] = trait_class
+        # Applying the same form to an instance of the generated class is a no-op.
+        _trait_class_cache[(trait_class, fingerprint)] = trait_class
+    return trait_class
+
+
+# Thread pools running sync field resolvers, shared by every spawner and keyed by size.
+_executors = {}
+
+
+def get_executor(max_workers):
+    """Returns the shared thread pool with the given number of workers."""
+    executor = _executors.get(max_workers)
+    if executor is None:
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='optionsspawner'
+        )
+        _executors[max_workers] = executor
+    return executor
+
+
+# Stores of the last used options, shared by every spawner and keyed by database path.
+_options_stores = {}
+
+
+def get_options_store(path, cache_size=1024):
+    """Returns the shared OptionsStore persisting user options to the database at path."""
+    store = _options_stores.get(path)
+    if store is None:
+        store = OptionsStore(path, cache_size=cache_size)
+        _options_stores[path] = store
+    return store
 
 
+# Admission controllers shared by every spawner, keyed by their limits.
+_admission_controllers = {}
+
+
+def get_admission_controller(limits):
+    """Returns the shared AdmissionController enforcing the given limits."""
+    key = tuple(sorted(limits.items()))
+    controller = _admission_controllers.get(key)
+    if controller is None:
+        controller = AdmissionController(limits)
+        _admission_controllers[key] = controller
+    return controller
+
 
 class OptionsFormSpawner(wrapspawner.WrapSpawner):
     """
@@ -29,45 +169,382 @@ class OptionsFormSpawner(wrapspawner.WrapSpawner):
     """
 
     form_fields = List(
-        trait=Instance(klass=FormField),
+        trait=Union([Instance(klass=FormField), Dict()]),
         help="""
         A list of FormField or subclass instances that will be rendered to the spawner options_form.
         The fields will be rendered to the options form in the order they appear in this list.
+        Fields may also be given as dicts of constructor arguments, with the registered name of
+        the field type under `type`, e.g. `{'type': 'text', 'trait_name': 'account'}`.
+        """
+    ).tag(config=True)
+
+    form_constraints = List(
+        trait=Instance(klass=FieldConstraint),
+        help="""
+        A list of FieldConstraint instances restricting the values of form fields depending on
+        the value of another field. All violated constraints are reported together when the
+        options are normalized.
+        """
+    ).tag(config=True)
+
+    form_collapsed_fieldsets = Dict(
+        value_trait=Unicode(),
+        help="""
+        The labels of fieldsets rendered collapsed, by fieldset name. The fields of collapsed
+        fieldsets are only loaded into the options form when the user opens the fieldset,
+        from `optionsspawner.handlers.OptionsFieldsetHandler`. Fields of fieldsets that were
+        not opened keep their default values.
+        """
+    ).tag(config=True)
+
+    form_variant_cache_size = Integer(32,
+        help="""
+        The maximum number of per-group variants of the options form kept rendered, when form
+        fields are restricted to specific groups. One variant exists per distinct combination of
+        group restrictions a user satisfies.
+        """
+    ).tag(config=True)
+
+    options_start_timeout = Float(30,
+        help="""
+        The number of seconds field resolvers may take when the spawner starts, before the start
+        fails. Set to 0 to wait indefinitely.
+        """
+    ).tag(config=True)
+
+    options_validation_timeout = Float(10,
+        help="""
+        The number of seconds the validators of all fields may take together when the spawner
+        starts, before the start fails. Set to 0 to wait indefinitely.
+        """
+    ).tag(config=True)
+
+    options_thread_pool_size = Integer(4,
+        help="""
+        The number of threads shared by all spawners to run field resolvers that are not
+        coroutine functions, and validators that are not, so that they never block the hub's
+        event loop.
+        """
+    ).tag(config=True)
+
+    options_admission_limits = Dict(
+        value_trait=Integer(),
+        help="""
+        The maximum number of child spawners starting at once for each value of a form field,
+        by trait name, e.g. `{'partition': 10}` lets 10 servers start at once per partition.
+        Further starts wait for a slot, and are admitted in the order they arrived.
+        """
+    ).tag(config=True)
+
+    options_admission_timeout = Float(0,
+        help="""
+        The number of seconds a start may wait to be admitted by `options_admission_limits`,
+        before the start fails. Set to 0 to wait indefinitely.
+        """
+    ).tag(config=True)
+
+    options_skip_unchanged_traits = Bool(False,
+        help="""
+        If True, form values equal to the current value of their trait on the child spawner are
+        not assigned, so their validation and observers do not run again. Whether this is faster
+        depends on the traits of the child spawner, see the apply_traits benchmarks.
+        """
+    ).tag(config=True)
+
+    options_store_path = Unicode('',
+        help="""
+        The path of an SQLite database in which the options of each user's last successful
+        start are kept. When set, the options form is prefilled with them, and offers to start
+        with them directly without submitting the form. Disabled when empty.
+        """
+    ).tag(config=True)
+
+    options_store_cache_size = Integer(1024,
+        help="""
+        The number of users whose last used options are kept in memory in front of the
+        options store database.
         """
     ).tag(config=True)
 
     def __init__(self, *args, **kwargs):
         """Render the options form and sets corresponding traitlets on the spawner."""
         super().__init__(*args, **kwargs)
+        self.options_form_builder, rendered_options_form = get_compiled_options_form(
+            get_form_fields(self.form_fields),
+            variant_cache_size=self.form_variant_cache_size,
+            constraints=self.form_constraints,
+            collapsed_fieldsets=self.form_collapsed_fieldsets
+        )
         self._apply_traits_from_fields()
-        self.options_form_builder = OptionsForm(self.form_fields)
-        rendered_options_form = self.options_form_builder.render()
+        # The child spawner configured by the last start, and the options applied to it.
+        self._configured_child = None
+        self._applied_options = None
+        self._admission_controller = None
+        if self.options_admission_limits:
+            self._admission_controller = get_admission_controller(self.options_admission_limits)
+        self._options_store = None
+        if self.options_store_path:
+            self._options_store = get_options_store(self.options_store_path,
+                cache_size=self.options_store_cache_size
+            )
         if not self.options_form:
-            self.options_form = rendered_options_form
+            if (self.options_form_builder.dynamic or self.options_form_builder.grouped or
+                    self._options_store is not None):
+                self.options_form = self._render_options_form
+            else:
+                self.options_form = rendered_options_form
+
+    def _get_user_options_form(self):
+        """Returns the (OptionsForm, rendered form) variant for the groups of the spawner user."""
+        if not self.options_form_builder.grouped:
+            return self.options_form_builder, None
+        group_names = {group.name for group in getattr(self.user, 'groups', [])}
+        return self.options_form_builder.get_variant(group_names)
+
+    def _render_options_form(self, spawner):
+        """
+        Renders per-group or dynamic forms each time the options form is requested, followed by
+        the user's previous options if they are stored.
+        """
+        with OPTIONS_FORM_RENDER_DURATION_SECONDS.time():
+            options_form, rendered_options_form = self._get_user_options_form()
+            if rendered_options_form is None or options_form.dynamic:
+                rendered_options_form = options_form.render_versioned()
+            previous_options = self._get_previous_options()
+            if previous_options:
+                rendered_options_form += options_form.render_previous_options(previous_options)
+        return rendered_options_form
+
+    def compile_options_fieldset(self, name):
+        """
+        Returns the CompiledForm of a collapsed fieldset of the options form rendered for this
+        spawner's user, or None if the user's form has no such fieldset.
+        """
+        with OPTIONS_FORM_RENDER_DURATION_SECONDS.time():
+            options_form, _ = self._get_user_options_form()
+            return options_form.compile_fieldset(name)
+
+    def _get_previous_options(self):
+        """
+        Returns the stored options of the spawner user's last start, or None. This is called
+        while rendering and parsing the form, which are synchronous, so cache misses read the
+        database on the calling thread; a miss is a single primary key lookup.
+        """
+        if self._options_store is None:
+            return None
+        return self._options_store.get(self.user.name)
+
+    async def _save_previous_options(self):
+        """
+        Stores the user options of the form fields, for the user's next start. The database is
+        written in the options thread pool, off the event loop.
+        """
+        if self._options_store is None or not self.user_options:
+            return
+        options = {
+            field.trait_name: self.user_options[field.trait_name]
+            for field in self.options_form_builder.fields
+            if field.trait_name in self.user_options
+        }
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(get_executor(self.options_thread_pool_size),
+            self._options_store.put, self.user.name, options
+        )
+
+    @property
+    def options_form_digest(self):
+        """
+        Returns the content hash of the options form rendered for this spawner's user. It can
+        be used as an ETag by anything serving the form.
+        """
+        options_form, _ = self._get_user_options_form()
+        return options_form.digest
+
+    @property
+    def options_form_version(self):
+        """
+        Returns the version of the options form rendered for this spawner's user, which is
+        submitted with the form to detect submissions from a different version of it.
+        """
+        options_form, _ = self._get_user_options_form()
+        return options_form.version
+
+    @property
+    def options_json_schema(self):
+        """
+        Returns the JSON Schema of natively typed user options accepted through the REST API
+        for this spawner's user.
+        """
+        options_form, _ = self._get_user_options_form()
+        return options_form.json_schema()
 
     def options_from_form(self, form_data):
         """Extracts options from form data, and returns a dict of the parsed values."""
-        options = self.options_form_builder.get_options_from_form(form_data)
+        with OPTIONS_FROM_FORM_DURATION_SECONDS.time():
+            options_form, _ = self._get_user_options_form()
+            if options_form.is_previous_options_request(form_data):
+                previous_options = self._get_previous_options()
+                if previous_options is not None:
+                    # The submitted inputs are ignored, previous options are normalized on start.
+                    return {
+                        field.trait_name: previous_options.get(field.trait_name, None)
+                        for field in options_form.fields
+                    }
+            options_form.check_digest(form_data)
+            previous_options = None
+            if options_form.collapsed_fieldsets:
+                previous_options = self._get_previous_options()
+                # As when prefilling the form, previous options are only used if still valid.
+                if previous_options and options_form.validate_many([previous_options])[0][1]:
+                    previous_options = None
+            options = options_form.get_options_from_form(form_data,
+                previous_options=previous_options
+            )
         return options
 
     def _apply_traits_from_fields(self, spawner_instance=None):
         """Sets traits on a spawner for fields in self.form_fields."""
         if not spawner_instance:
             spawner_instance = self
-        traits = {field.trait_name: field.get_trait() for field in self.form_fields}
-        spawner_instance.add_traits(**traits)
+        trait_class = get_trait_class(type(spawner_instance), self.options_form_builder)
+        if type(spawner_instance) is trait_class:
+            return
+        spawner_instance.__class__ = trait_class
+        for field in self.options_form_builder.fields:
+            trait_class.__dict__[field.trait_name].instance_init(spawner_instance)
 
-    def _set_trait_values_from_options(self, spawner_instance=None):
-        """Sets the values of traits on a spawner from the options form."""
+    def _get_normalized_options(self):
+        """Returns the user options normalized by the options form of the spawner user."""
+        with OPTIONS_NORMALIZE_DURATION_SECONDS.time():
+            options_form, _ = self._get_user_options_form()
+            return options_form.get_normalized_user_options(self.user_options)
+
+    def _set_trait_values_from_options(self, spawner_instance=None, normalized_options=None):
+        """
+        Sets the values of traits on a spawner from the options form, including the trait values
+        of selected presets. All values are assigned while trait notifications are held, so
+        cross-validation and observers run once, after every value is set.
+        """
         if not spawner_instance:
             spawner_instance = self
-        normalized_options = self.options_form_builder.get_normalized_user_options(self.user_options)
-        for trait_name, value in normalized_options.items():
-            setattr(spawner_instance, trait_name, value)
-
-    def start(self, *args, **kwargs):
-        """Propagates form-defined traits and values to child spawner before starting."""
-        self.construct_child()
-        self._apply_traits_from_fields(spawner_instance=self.child_spawner)
-        self._set_trait_values_from_options(spawner_instance=self.child_spawner)
-        return super().start(*args, **kwargs)
+        if normalized_options is None:
+            normalized_options = self._get_normalized_options()
+        options_form, _ = self._get_user_options_form()
+        options_form.check_preset_traits(type(spawner_instance))
+        trait_values = options_form.expand_presets(normalized_options)
+        skip_unchanged = self.options_skip_unchanged_traits
+        with spawner_instance.hold_trait_notifications():
+            for trait_name, value in trait_values.items():
+                if (skip_unchanged and spawner_instance.trait_has_value(trait_name) and
+                        getattr(spawner_instance, trait_name) == value):
+                    continue
+                setattr(spawner_instance, trait_name, value)
+
+    async def _validate_options(self, normalized_options):
+        """Runs the field validators of the user's form within the validation time budget."""
+        options_form, _ = self._get_user_options_form()
+        if not options_form.validated_fields:
+            return
+        validating = options_form.validate_user_options(normalized_options,
+            executor=get_executor(self.options_thread_pool_size)
+        )
+        try:
+            await asyncio.wait_for(validating, timeout=self.options_validation_timeout or None)
+        except asyncio.TimeoutError:
+            error_message = 'Options form fields were not validated within {} seconds.'.format(
+                self.options_validation_timeout)
+            raise TimeoutError(error_message)
+
+    async def _resolve_options(self, normalized_options):
+        """Runs the field resolvers of the user's form within the start time budget."""
+        options_form, _ = self._get_user_options_form()
+        resolving = options_form.resolve_user_options(normalized_options,
+            executor=get_executor(self.options_thread_pool_size)
+        )
+        try:
+            return await asyncio.wait_for(resolving, timeout=self.options_start_timeout or None)
+        except asyncio.TimeoutError:
+            error_message = 'Options form fields did not resolve within {} seconds.'.format(
+                self.options_start_timeout)
+            raise TimeoutError(error_message)
+
+    def _restore_configured_child(self, applied_options):
+        """
+        Returns the child spawner configured by the last start, if it was configured with the
+        same options and child class, or None. JupyterHub clears the spawner's state, and with it
+        the child spawner, before each start, so the configured child is kept apart from it.
+        """
+        child_spawner = self._configured_child
+        if (child_spawner is None or applied_options != self._applied_options or
+                not isinstance(child_spawner, self.child_class)):
+            return None
+        # As in construct_child, the child's state was cleared, and is loaded from ours.
+        child_spawner.server = self._server
+        if self.child_state:
+            child_spawner.load_state(self.child_state)
+        return child_spawner
+
+    async def start(self, *args, **kwargs):
+        """
+        Propagates form-defined traits and values to child spawner before starting. The options
+        are first checked by the field validators. Then field resolvers run concurrently with the
+        construction of the child spawner. A restart with the same normalized options reuses the
+        child spawner configured by the last start, unless the form has resolvers. The child spawner only starts once it is
+        admitted by the limits on concurrent starts per option value, if any are configured.
+        Once it started, the options are stored for the user's next start if an options store is
+        configured.
+        """
+        normalized_options = self._get_normalized_options()
+        await self._validate_options(normalized_options)
+        applied_options = tuple(sorted(normalized_options.items()))
+        options_form, _ = self._get_user_options_form()
+        # Resolved values may change between starts with the same options, e.g. quota lookups,
+        # so children of forms with resolvers are configured anew on every start.
+        reusable = not options_form.resolvers
+        if self.child_spawner is None and reusable:
+            self.child_spawner = self._restore_configured_child(applied_options)
+        reuse_child = (
+            reusable and
+            self.child_spawner is not None and
+            self.child_spawner is self._configured_child and
+            applied_options == self._applied_options
+        )
+        if not reuse_child:
+            resolving = None
+            if options_form.resolvers:
+                resolving = asyncio.ensure_future(self._resolve_options(normalized_options))
+                # Let the resolvers start before the child is constructed, so the two overlap.
+                await asyncio.sleep(0)
+            try:
+                with OPTIONS_CONSTRUCT_CHILD_DURATION_SECONDS.time():
+                    self.construct_child()
+                    self._apply_traits_from_fields(spawner_instance=self.child_spawner)
+            except Exception:
+                if resolving is not None:
+                    resolving.cancel()
+                raise
+            resolved_options = normalized_options
+            if resolving is not None:
+                resolved_options = await resolving
+            self._set_trait_values_from_options(
+                spawner_instance=self.child_spawner,
+                normalized_options=resolved_options
+            )
+            self._configured_child = self.child_spawner
+            self._applied_options = applied_options
+        if self._admission_controller is None:
+            with OPTIONS_CHILD_START_DURATION_SECONDS.time():
+                result = await super().start(*args, **kwargs)
+        else:
+            admission = self._admission_controller.admit(normalized_options,
+                timeout=self.options_admission_timeout or None
+            )
+            async with admission:
+                with OPTIONS_CHILD_START_DURATION_SECONDS.time():
+                    result = await super().start(*args, **kwargs)
+        try:
+            await self._save_previous_options()
+        except Exception:
+            # The server is already running, so failing to store its options must not fail it.
+            self.log.exception("Failed to store the options of %s's start", self.user.name)
+        return result
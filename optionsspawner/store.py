@@ -0,0 +1,76 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Boulder Research Computing
+
+"""
+Persisted per-user options of the last successful spawn.
+"""
+
+import json
+import sqlite3
+import threading
+from .utils import LRUCache
+
+
+
+class OptionsStore:
+    """
+    Stores the user options of each user's last spawn in an SQLite database, with the most
+    recently used entries kept in an in-memory LRU cache in front of it. Options are stored
+    as JSON, so they must only contain JSON serializable values, as form data does.
+    """
+
+    # Cached in place of users without stored options, so repeated misses skip the database.
+    _missing = object()
+
+    def __init__(self, path, cache_size=1024):
+        """Opens, and creates if needed, the database at `path`. ':memory:' is accepted."""
+        self._path = path
+        self._cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS user_options '
+                '(username TEXT PRIMARY KEY, options TEXT NOT NULL)'
+            )
+
+    @property
+    def path(self):
+        return self._path
+
+    def get(self, username):
+        """Returns a copy of the stored options of a user, or None if there are none."""
+        options = self._cache.get(username)
+        if options is None:
+            with self._lock:
+                row = self._connection.execute(
+                    'SELECT options FROM user_options WHERE username = ?', (username,)
+                ).fetchone()
+            options = json.loads(row[0]) if row else self._missing
+            self._cache.put(username, options)
+        if options is self._missing:
+            return None
+        return dict(options)
+
+    def put(self, username, options):
+        """Stores the options of a user, replacing any previously stored options."""
+        options = dict(options)
+        serialized = json.dumps(options, sort_keys=True)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO user_options (username, options) VALUES (?, ?)',
+                (username, serialized)
+            )
+        self._cache.put(username, options)
+
+    def delete(self, username):
+        """Removes the stored options of a user."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM user_options WHERE username = ?', (username,)
+            )
+        self._cache.put(username, self._missing)
+
+    def close(self):
+        self._cache.clear()
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,161 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Boulder Research Computing
+
+"""
+Caching utilities shared by the options form fields and the spawner.
+"""
+
+import asyncio
+import collections
+import functools
+import inspect
+import logging
+import time
+
+
+log = logging.getLogger(__name__)
+
+
+async def call_maybe_async(func, *args, executor=None):
+    """
+    Calls func with args and returns its result. Coroutine functions are awaited on the running
+    event loop, other callables are run in the given executor, or the loop's default executor.
+    """
+    if inspect.iscoroutinefunction(func):
+        return await func(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args))
+
+
+class LRUCache:
+    """
+    A dict-like cache bounded to `maxsize` entries, evicting the least recently used entry.
+    """
+
+    def __init__(self, maxsize=128):
+        self._maxsize = maxsize
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Returns the entry for key and marks it as most recently used."""
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self._entries[key]
+
+    def put(self, key, value):
+        """Stores an entry, evicting the least recently used entry if the cache is full."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        return self._entries.pop(key, default)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class TTLCache(LRUCache):
+    """
+    An LRUCache whose entries also expire `ttl` seconds after they were stored.
+    """
+
+    def __init__(self, ttl, maxsize=128):
+        super().__init__(maxsize)
+        self._ttl = ttl
+
+    @property
+    def ttl(self):
+        return self._ttl
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def get(self, key, default=None):
+        """Returns the entry for key if it has not expired, and marks it as most recently used."""
+        entry = super().get(key)
+        if entry is None:
+            return default
+        expires, value = entry
+        if time.monotonic() >= expires:
+            self.pop(key)
+            return default
+        return value
+
+    def put(self, key, value):
+        super().put(key, (time.monotonic() + self._ttl, value))
+
+
+class RefreshingCache:
+    """
+    Caches the value returned by a sync or async provider for `ttl` seconds. Once the value is
+    stale it continues to be served while a single refresh runs in the background on the running
+    event loop, so readers never wait on the provider. Sync providers are run in the loop's
+    default executor.
+    """
+
+    def __init__(self, provider, ttl, initial=None, validate=None):
+        """
+        Primes the cache with `initial`, or by calling a sync provider once if no initial value is
+        given. Async providers require an initial value. `validate` is called with each refreshed
+        value and may raise to reject it, in which case the previous value is kept.
+        """
+        self._provider = provider
+        self._ttl = ttl
+        self._validate = validate
+        self._refresh_task = None
+        if initial is None:
+            if inspect.iscoroutinefunction(provider):
+                raise ValueError('An initial value is required for an async provider.')
+            initial = provider()
+        if validate:
+            validate(initial)
+        self._value = initial
+        self._updated = time.monotonic()
+
+    @property
+    def provider(self):
+        return self._provider
+
+    @property
+    def ttl(self):
+        return self._ttl
+
+    @property
+    def is_stale(self):
+        return time.monotonic() - self._updated >= self._ttl
+
+    def get(self):
+        """Returns the cached value, scheduling a background refresh if it is stale."""
+        if self._refresh_task is None and self.is_stale:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # Refreshes are driven by the hub's event loop, outside of it serve the cache.
+                loop = None
+            if loop is not None:
+                self._refresh_task = loop.create_task(self.refresh())
+        return self._value
+
+    async def refresh(self):
+        """Calls the provider and stores its value. Failures are logged and keep the old value."""
+        try:
+            value = await call_maybe_async(self._provider)
+            if self._validate:
+                self._validate(value)
+            self._value = value
+        except Exception:
+            log.exception('Failed to refresh value from %r, serving the cached value.', self._provider)
+        finally:
+            # Failed refreshes are also retried only once the ttl has elapsed again.
+            self._updated = time.monotonic()
+            self._refresh_task = None
+        return self._value
@@ -0,0 +1,89 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Research Computing
+
+import asyncio
+import unittest
+from optionsspawner.admission import (
+    AdmissionController,
+    AdmissionQueue,
+)
+
+
+
+class AdmissionQueueTestCase(unittest.IsolatedAsyncioTestCase):
+    """Tests for optionsspawner.admission.AdmissionQueue."""
+
+    async def test_waiters_admitted_in_arrival_order(self):
+        queue = AdmissionQueue(1)
+        admitted = []
+
+        async def hold(name):
+            await queue.acquire()
+            admitted.append(name)
+            await asyncio.sleep(0)
+            queue.release()
+
+        await queue.acquire()
+        tasks = [asyncio.ensure_future(hold(name)) for name in ('first', 'second', 'third')]
+        await asyncio.sleep(0)
+        self.assertEqual(queue.depth, 3)
+        queue.release()
+        await asyncio.gather(*tasks)
+        self.assertEqual(admitted, ['first', 'second', 'third'])
+        self.assertEqual(queue.active, 0)
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        queue = AdmissionQueue(1)
+        await queue.acquire()
+        waiting = asyncio.ensure_future(queue.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(queue.depth, 0)
+        queue.release()
+        self.assertEqual(queue.active, 0)
+
+    async def test_release_before_cancelled_waiter_resumes(self):
+        queue = AdmissionQueue(1)
+        await queue.acquire()
+        waiting = asyncio.ensure_future(queue.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        queue.release()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(queue.depth, 0)
+        self.assertEqual(queue.active, 0)
+
+
+class AdmissionControllerTestCase(unittest.IsolatedAsyncioTestCase):
+    """Tests for optionsspawner.admission.AdmissionController."""
+
+    async def test_limits_concurrency_per_value(self):
+        controller = AdmissionController({'partition': 2})
+        running = {'debug': 0, 'normal': 0}
+        peaks = {'debug': 0, 'normal': 0}
+
+        async def start(partition):
+            async with controller.admit({'partition': partition, 'cores': 1}):
+                running[partition] += 1
+                peaks[partition] = max(peaks[partition], running[partition])
+                await asyncio.sleep(0.01)
+                running[partition] -= 1
+
+        await asyncio.gather(*(start(partition) for partition in ['debug'] * 5 + ['normal']))
+        self.assertEqual(peaks, {'debug': 2, 'normal': 1})
+
+    async def test_admission_timeout_releases_slots(self):
+        controller = AdmissionController({'partition': 1, 'image': 1})
+        async with controller.admit({'partition': 'debug', 'image': 'base'}):
+            with self.assertRaises(TimeoutError):
+                async with controller.admit({'partition': 'normal', 'image': 'base'}, timeout=0.01):
+                    pass
+        self.assertEqual(controller.get_queue(('partition', 'normal')).active, 0)
+        async with controller.admit({'partition': 'normal', 'image': 'base'}, timeout=0.01):
+            pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -97,6 +97,17 @@ class CheckboxInputFieldTestCase(unittest.TestCase):
         normalized = field.normalize_user_option(['test'])
         self.assertEqual(normalized, expected)
 
+    def test_normalize_json_checkbox_unicode_value(self):
+        field = CheckboxInputField('test_attr',
+            label='Test Attribute',
+            attr_value='exclusive'
+        )
+        self.assertEqual(field.normalize_json_option('exclusive'), 'exclusive')
+        self.assertEqual(field.normalize_json_option(True), 'exclusive')
+        self.assertEqual(field.normalize_json_option(False), '')
+        self.assertRaises(ValueError, field.normalize_json_option, 'shared')
+        self.assertEqual(field.json_schema()['enum'], ['exclusive', ''])
+
 
 if __name__ == '__main__':
     unittest.main()
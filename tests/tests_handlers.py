@@ -0,0 +1,47 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Research Computing
+
+import unittest
+from unittest import mock
+from tornado import web
+from optionsspawner.forms import SelectField
+from optionsspawner.handlers import (
+    OptionsSchemaHandler,
+    SelectFieldSearchHandler,
+)
+
+
+
+class SelectFieldSearchHandlerTestCase(unittest.TestCase):
+    """Tests for optionsspawner.handlers.SelectFieldSearchHandler."""
+
+    def test_route_serves_searchable_fields(self):
+        field = SelectField('project', choices=[('alpha', 'Alpha')], searchable=True)
+        form_fields = [
+            field,
+            {'type': 'select', 'trait_name': 'account', 'choices': [('a', 'A')], 'searchable': True},
+            {'type': 'select', 'trait_name': 'partition', 'choices': [('debug', 'Debug')]},
+            {'type': 'text', 'trait_name': 'reservation'},
+        ]
+        pattern, handler, kwargs = SelectFieldSearchHandler.route(form_fields)
+        searchable_fields = kwargs['searchable_fields']
+        self.assertIs(handler, SelectFieldSearchHandler)
+        self.assertEqual(sorted(searchable_fields), ['account', 'project'])
+        self.assertIs(searchable_fields['project'], field)
+        self.assertEqual(searchable_fields['account'].search('a'), [('a', 'A')])
+
+
+class OptionsSchemaHandlerTestCase(unittest.TestCase):
+    """Tests for optionsspawner.handlers.OptionsSchemaHandler."""
+
+    def test_unknown_server_not_found(self):
+        handler = mock.MagicMock()
+        handler.current_user.orm_spawners = {'': mock.Mock()}
+        get = OptionsSchemaHandler.get.__wrapped__
+        with self.assertRaises(web.HTTPError) as context:
+            get(handler, 'bogus')
+        self.assertEqual(context.exception.status_code, 404)
+        handler.current_user.spawners.__getitem__.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
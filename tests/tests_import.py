@@ -0,0 +1,60 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Research Computing
+
+import json
+import subprocess
+import sys
+import unittest
+
+
+
+def import_in_subprocess(statement):
+    """
+    Runs an import statement in a fresh interpreter, and returns the cumulative import time of
+    the optionsspawner package in seconds and the names of the modules it imported.
+    """
+    script = '\n'.join([
+        'import json, sys',
+        'before = set(sys.modules)',
+        statement,
+        'print(json.dumps(sorted(set(sys.modules) - before)))',
+    ])
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script],
+        capture_output=True, text=True, check=True
+    )
+    cumulative = 0
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == 'optionsspawner':
+            cumulative = int(parts[1]) / 1e6
+    return cumulative, json.loads(result.stdout)
+
+
+class ImportTestCase(unittest.TestCase):
+    """Tests for the import time of the optionsspawner package."""
+
+    # Generous enough for slow machines, while catching eager imports of the hub.
+    import_time_budget = 0.1
+
+    def test_package_import_is_lazy(self):
+        import_time, modules = import_in_subprocess('import optionsspawner')
+        for heavy_module in ('traitlets', 'tornado', 'wrapspawner', 'jupyterhub'):
+            self.assertNotIn(heavy_module, modules)
+        self.assertLess(import_time, self.import_time_budget)
+
+    def test_field_import_skips_hub(self):
+        _, modules = import_in_subprocess('from optionsspawner.forms import TextInputField')
+        self.assertIn('optionsspawner.forms.characterfield', modules)
+        for heavy_module in ('tornado', 'wrapspawner', 'jupyterhub'):
+            self.assertNotIn(heavy_module, modules)
+        self.assertNotIn('optionsspawner.forms.selectfield', modules)
+
+    def test_form_classes_exported_by_package(self):
+        import optionsspawner
+        from optionsspawner.forms import FormField, OptionsForm
+        self.assertIs(optionsspawner.OptionsForm, OptionsForm)
+        self.assertIs(optionsspawner.FormField, FormField)
+        self.assertIn('OptionsForm', optionsspawner.__all__)
+
+
+if __name__ == '__main__':
+    unittest.main()
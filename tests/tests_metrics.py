@@ -0,0 +1,37 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Research Computing
+
+import unittest
+from optionsspawner import metrics
+from optionsspawner.forms import (
+    OptionsForm,
+    TextInputField,
+)
+
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Tests for optionsspawner.metrics."""
+
+    def test_noop_metric(self):
+        metric = metrics.NoopMetric()
+        with metric.labels(field='test_attr').time():
+            metric.observe(1.0)
+            metric.inc()
+
+    @unittest.skipIf(metrics.Counter is None, 'prometheus_client is not installed')
+    def test_validation_failures_counted_per_field(self):
+        from prometheus_client import REGISTRY
+        labels = {'field': 'metrics_test_attr', 'error': 'ValueError'}
+        sample = 'optionsspawner_validation_failures_total'
+        before = REGISTRY.get_sample_value(sample, labels) or 0
+        field = TextInputField('metrics_test_attr',
+            label='Test Attribute',
+            attr_required=True
+        )
+        form = OptionsForm(form_fields=[field])
+        self.assertRaises(ValueError, form.get_normalized_user_options, {'metrics_test_attr': ['']})
+        self.assertEqual(REGISTRY.get_sample_value(sample, labels), before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
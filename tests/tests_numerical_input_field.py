@@ -107,6 +107,40 @@ class NumericalInputFieldTestCase(unittest.TestCase):
         normalized = field.normalize_user_option([''])
         self.assertEqual(normalized, expected)
 
+    def test_normalize_json_integer(self):
+        field = NumericalInputField('test_attr',
+            label='Test Attribute',
+            attr_min=1,
+            attr_max=8
+        )
+        self.assertEqual(field.normalize_json_option(4), 4)
+        self.assertEqual(field.normalize_json_option(4.0), 4)
+        self.assertRaises(ValueError, field.normalize_json_option, 4.5)
+        self.assertRaises(ValueError, field.normalize_json_option, '4')
+        self.assertRaises(ValueError, field.normalize_json_option, True)
+        self.assertRaises(ValueError, field.normalize_json_option, 9)
+
+    def test_normalize_out_of_bounds(self):
+        field = NumericalInputField('test_attr',
+            label='Test Attribute',
+            attr_min=1,
+            attr_max=8
+        )
+        self.assertEqual(field.normalize_user_option(['8']), 8)
+        self.assertRaises(ValueError, field.normalize_user_option, ['1000'])
+        self.assertRaises(ValueError, field.normalize_user_option, ['0'])
+        self.assertEqual(field.normalize_user_option(['']), 0)
+
+    def test_json_schema(self):
+        field = NumericalInputField('test_attr',
+            label='Test Attribute',
+            attr_min=0,
+            attr_max=2,
+            attr_step=0.1
+        )
+        expected = {'title': 'Test Attribute', 'default': 0.0, 'type': 'number', 'minimum': 0, 'maximum': 2}
+        self.assertEqual(field.json_schema(), expected)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,9 +1,15 @@
 # Copyright (c) 2018, Zebula Sampedro, CU Research Computing
 
+import asyncio
+import gzip
 import unittest
 from optionsspawner.forms import (
     OptionsForm,
+    FieldConstraint,
     TextInputField,
+    NumericalInputField,
+    CheckboxInputField,
+    SelectField,
 )
 
 
@@ -29,6 +35,105 @@ class OptionsFormTestCase(unittest.TestCase):
         rendered = form.render()
         self.assertEqual(rendered, expected)
 
+    def test_compile_reuses_compiled_form(self):
+        field = TextInputField('text_attr',
+            label="First Input"
+        )
+        form = OptionsForm(form_fields=[field])
+
+        compiled = form.compile()
+        self.assertIs(form.compile(), compiled)
+        self.assertEqual(compiled.html, form.render())
+        self.assertEqual(compiled.html_bytes, compiled.html.encode('utf-8'))
+        self.assertIsNone(compiled.gzipped)
+        self.assertRaises(AttributeError, setattr, compiled, 'html', '')
+
+    def test_compile_gzips_large_forms(self):
+        field = SelectField('select_attr',
+            choices=[(i, 'Option {}'.format(i)) for i in range(5000)]
+        )
+        form = OptionsForm(form_fields=[field])
+
+        compiled = form.compile()
+        self.assertGreaterEqual(len(compiled.html_bytes), form.gzip_min_size)
+        self.assertEqual(gzip.decompress(compiled.gzipped), compiled.html_bytes)
+        self.assertIs(compiled.gzipped, compiled.gzipped)
+
+    def test_render_versioned_includes_digest(self):
+        field = TextInputField('text_attr',
+            label="First Input"
+        )
+        form = OptionsForm(form_fields=[field])
+
+        expected = form.render() + (
+            '<input type="hidden" name="options_form_digest" value="{}">\n'.format(form.version)
+        )
+        self.assertEqual(form.render_versioned(), expected)
+        self.assertEqual(len(form.digest), 64)
+        self.assertEqual(len(form.version), 64)
+
+    def test_check_digest(self):
+        field = TextInputField('text_attr',
+            label="First Input"
+        )
+        form = OptionsForm(form_fields=[field])
+        changed_form = OptionsForm(form_fields=[
+            TextInputField('text_attr', label="Changed Input"),
+        ])
+
+        form.check_digest({'options_form_digest': [form.version]})
+        form.check_digest({'text_attr': ['test']})
+        self.assertNotEqual(form.version, changed_form.version)
+        self.assertRaises(ValueError, form.check_digest,
+            {'options_form_digest': [changed_form.version]})
+
+    def test_check_digest_after_capacity_refresh(self):
+        responses = [{'debug': 4, 'normal': 1}, {'debug': 0, 'normal': 1}]
+        field = SelectField('select_attr',
+            choices=[('debug', 'Debug'), ('normal', 'Normal')],
+            capacity=lambda: responses.pop(0) if len(responses) > 1 else responses[0],
+            capacity_ttl=0
+        )
+        form = OptionsForm(form_fields=[field])
+        rendered = form.render()
+        digest = form.digest
+        version = form.version
+
+        async def refresh():
+            form.render()
+            await asyncio.sleep(0.1)
+            return form.render()
+        self.assertNotEqual(asyncio.run(refresh()), rendered)
+        # The content hash follows the capacity annotations, the version does not.
+        self.assertNotEqual(form.digest, digest)
+        self.assertEqual(form.version, version)
+        form.check_digest({'options_form_digest': [version]})
+
+    def test_render_previous_options(self):
+        field1 = TextInputField('text_attr', label="Input")
+        field2 = SelectField('select_attr', choices=[(1.0, 'One'), (2.0, 'Two')])
+        field3 = CheckboxInputField('checkbox_attr', attr_value='exclusive')
+        form = OptionsForm(form_fields=[field1, field2, field3])
+
+        rendered = form.render_previous_options({
+            'text_attr': ['</script>'],
+            'select_attr': ['2.0'],
+            'checkbox_attr': ['on'],
+        })
+        self.assertIn('name="options_form_previous"', rendered)
+        # Pressing Enter in an input must not submit the form as a start with previous options.
+        self.assertNotIn('type="submit"', rendered)
+        self.assertIn('"checkbox_attr": true', rendered)
+        self.assertIn('"select_attr": "2.0"', rendered)
+        self.assertIn('"text_attr": "<\\/script>"', rendered)
+        # Options that are no longer valid for the form are not offered.
+        self.assertEqual(form.render_previous_options({'select_attr': ['3.0']}), '')
+        self.assertTrue(form.is_previous_options_request({'options_form_previous': ['1']}))
+        self.assertFalse(form.is_previous_options_request({'text_attr': ['test']}))
+        self.assertFalse(form.is_previous_options_request({'options_form_previous': ['']}))
+        # Collapsed fieldsets are prefilled once they are loaded.
+        self.assertIn('optionsfieldsetload', rendered)
+
     def test_get_options_from_form(self):
         expected = {
             'text_attr_1': ['test1'],
@@ -50,6 +155,60 @@ class OptionsFormTestCase(unittest.TestCase):
         options = form.get_options_from_form(form_data)
         self.assertEqual(options, expected)
 
+    def test_collapsed_fieldsets_rendered_on_demand(self):
+        field1 = TextInputField('text_attr', label="Input")
+        field2 = NumericalInputField('numerical_attr', label="Number", fieldset='advanced')
+        field3 = CheckboxInputField('checkbox_attr', label="Check", fieldset='advanced',
+            attr_checked=True)
+        form = OptionsForm(form_fields=[field1, field2, field3],
+            collapsed_fieldsets={'advanced': 'Advanced options', 'unused': 'Unused'}
+        )
+
+        self.assertEqual(form.collapsed_fieldsets, {'advanced': 'Advanced options'})
+        rendered = form.render()
+        self.assertIn(field1.render(), rendered)
+        self.assertNotIn(field2.render(), rendered)
+        compiled_fieldset = form.compile_fieldset('advanced')
+        self.assertIn('data-version="{}"'.format(compiled_fieldset.digest), rendered)
+        self.assertEqual(form.render_fieldset('advanced'), field2.render() + '\n' + field3.render())
+        self.assertIsNone(form.render_fieldset('unused'))
+
+    def test_collapsed_fieldsets_reject_required_fields_without_default(self):
+        required_field = TextInputField('text_attr', attr_required=True, fieldset='advanced')
+        self.assertRaises(ValueError, OptionsForm,
+            form_fields=[required_field],
+            collapsed_fieldsets={'advanced': 'Advanced options'}
+        )
+        # Required fields with a default, or rendered inline, are accepted.
+        OptionsForm(
+            form_fields=[TextInputField('text_attr', attr_required=True, attr_value='default',
+                fieldset='advanced')],
+            collapsed_fieldsets={'advanced': 'Advanced options'}
+        )
+        OptionsForm(form_fields=[required_field])
+
+    def test_get_options_from_form_with_collapsed_fieldsets(self):
+        field1 = TextInputField('text_attr', label="Input")
+        field2 = NumericalInputField('numerical_attr', label="Number", fieldset='advanced')
+        field3 = CheckboxInputField('checkbox_attr', label="Check", fieldset='advanced',
+            attr_checked=True)
+        form = OptionsForm(form_fields=[field1, field2, field3],
+            collapsed_fieldsets={'advanced': 'Advanced options'}
+        )
+
+        form_data = {'text_attr': ['test'], 'numerical_attr': ['4']}
+        options = form.get_options_from_form(form_data)
+        self.assertEqual(form.get_normalized_user_options(options),
+            {'text_attr': 'test', 'numerical_attr': 0, 'checkbox_attr': True})
+        # Unloaded fieldsets take previous options where given.
+        options = form.get_options_from_form(form_data, previous_options={'numerical_attr': ['2']})
+        self.assertEqual(form.get_normalized_user_options(options),
+            {'text_attr': 'test', 'numerical_attr': 2, 'checkbox_attr': True})
+        form_data['options_form_fieldsets'] = ['advanced']
+        options = form.get_options_from_form(form_data, previous_options={'numerical_attr': ['2']})
+        self.assertEqual(form.get_normalized_user_options(options),
+            {'text_attr': 'test', 'numerical_attr': 4, 'checkbox_attr': False})
+
     def test_get_options_from_empty_form(self):
         expected = {
             'text_attr_1': None,
@@ -84,6 +243,282 @@ class OptionsFormTestCase(unittest.TestCase):
         normalized_options = form.get_normalized_user_options(user_options)
         self.assertEqual(normalized_options, expected)
 
+    def test_get_normalized_options_from_empty_user_options(self):
+        expected = {
+            'text_attr': 'default',
+            'select_attr': 2,
+        }
+        field1 = TextInputField('text_attr',
+            label="First Input",
+            attr_value='default'
+        )
+        field2 = SelectField('select_attr',
+            choices=[(1, 'One'), (2, 'Two')],
+            default=2
+        )
+        form = OptionsForm(form_fields=[field1, field2])
+
+        normalized_options = form.get_normalized_user_options({})
+        self.assertEqual(normalized_options, expected)
+        # The cached defaults must not be shared with callers.
+        normalized_options['text_attr'] = 'changed'
+        self.assertEqual(form.get_normalized_user_options({}), expected)
+
+    def test_get_normalized_options_follow_refreshed_choices(self):
+        responses = [[('x', 'X'), ('y', 'Y')], [('y', 'Y'), ('z', 'Z')]]
+        field = SelectField('queue',
+            choices=lambda: responses.pop(0) if len(responses) > 1 else responses[0],
+            choices_ttl=0
+        )
+        form = OptionsForm(form_fields=[field])
+        self.assertEqual(form.get_normalized_user_options({}), {'queue': 'x'})
+
+        async def refresh():
+            form.compile()
+            await asyncio.sleep(0.1)
+            return form.get_normalized_user_options({})
+        self.assertEqual(asyncio.run(refresh()), {'queue': 'y'})
+
+    def test_get_normalized_options_from_empty_user_options_required(self):
+        field = TextInputField('text_attr',
+            label="First Input",
+            attr_required=True
+        )
+        form = OptionsForm(form_fields=[field])
+        self.assertRaises(ValueError, form.get_normalized_user_options, {})
+
+    def test_get_normalized_json_options(self):
+        field1 = TextInputField('text_attr', label="Input", attr_required=True)
+        field2 = NumericalInputField('numerical_attr', label="Number", attr_value=1)
+        field3 = CheckboxInputField('checkbox_attr', label="Check")
+        form = OptionsForm(form_fields=[field1, field2, field3])
+
+        normalized_options = form.get_normalized_user_options({'text_attr': 'test', 'numerical_attr': 2})
+        self.assertEqual(normalized_options,
+            {'text_attr': 'test', 'numerical_attr': 2, 'checkbox_attr': False})
+        self.assertRaises(ValueError, form.get_normalized_user_options,
+            {'text_attr': 'test', 'unknown_attr': 1})
+        results = form.validate_many([
+            {'text_attr': 'test', 'checkbox_attr': True},
+            {'text_attr': ['test'], 'checkbox_attr': ['on']},
+            {'numerical_attr': 'two'},
+        ])
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertEqual(sorted(results[2][1]), ['numerical_attr', 'text_attr'])
+
+    def test_json_schema(self):
+        field1 = TextInputField('text_attr', label="Input", attr_required=True)
+        field2 = SelectField('select_attr', label="Select", choices=[(1, 'One'), (2, 'Two')])
+        form = OptionsForm(form_fields=[field1, field2])
+
+        schema = form.json_schema()
+        self.assertIs(form.json_schema(), schema)
+        self.assertEqual(schema['required'], ['text_attr'])
+        self.assertFalse(schema['additionalProperties'])
+        self.assertEqual(schema['properties']['select_attr'],
+            {'title': 'Select', 'default': 1, 'type': 'integer', 'enum': [1, 2]})
+
+    def test_validate_many(self):
+        field1 = TextInputField('text_attr',
+            label="Required Input",
+            attr_required=True
+        )
+        field2 = SelectField('select_attr',
+            choices=[(1, 'One'), (2, 'Two')]
+        )
+        form = OptionsForm(form_fields=[field1, field2])
+
+        results = form.validate_many([
+            {'text_attr': ['test'], 'select_attr': ['2']},
+            {'text_attr': [''], 'select_attr': ['3']},
+            {},
+        ])
+        self.assertEqual(results[0], ({'text_attr': 'test', 'select_attr': 2}, {}))
+        normalized, errors = results[1]
+        self.assertIsNone(normalized)
+        self.assertEqual(sorted(errors), ['select_attr', 'text_attr'])
+        self.assertEqual(results[2], (None, {'text_attr': 'Required field cannot be empty: Required Input.'}))
+
+    def test_constraints_report_all_violations(self):
+        form = OptionsForm(
+            form_fields=[
+                SelectField('partition', label='Partition',
+                    choices=[('debug', 'Debug'), ('normal', 'Normal')]),
+                NumericalInputField('cores', label='Cores', attr_value=1),
+                NumericalInputField('hours', label='Hours', attr_value=1),
+            ],
+            constraints=[
+                FieldConstraint('partition', 'debug', maximum={'cores': 2, 'hours': 1}),
+                FieldConstraint('partition', 'normal', minimum={'hours': 2}),
+            ]
+        )
+
+        normalized = form.get_normalized_user_options(
+            {'partition': ['debug'], 'cores': ['2'], 'hours': ['1']})
+        self.assertEqual(normalized, {'partition': 'debug', 'cores': 2, 'hours': 1})
+        with self.assertRaises(ValueError) as context:
+            form.get_normalized_user_options({'partition': ['debug'], 'cores': ['4'], 'hours': ['8']})
+        self.assertEqual(str(context.exception),
+            'Cores must be at most 2 when Partition is debug.\n'
+            'Hours must be at most 1 when Partition is debug.')
+        # The defaults are checked against the constraints too.
+        self.assertRaises(ValueError, form.get_normalized_user_options, {'partition': ['normal']})
+
+        results = form.validate_many([{'partition': ['debug'], 'cores': ['4']}])
+        self.assertEqual(results[0], (None, {'cores': 'Cores must be at most 2 when Partition is debug.'}))
+
+    def test_constraints_on_unknown_fields_rejected(self):
+        fields = [TextInputField('text_attr')]
+        constraint = FieldConstraint('text_attr', 'a', allowed={'other_attr': ['b']})
+        self.assertRaises(ValueError, OptionsForm, form_fields=fields, constraints=[constraint])
+
+    def test_variant_keeps_constraints_on_visible_fields(self):
+        field1 = SelectField('image', label='Image', choices=[('cpu', 'CPU'), ('gpu', 'GPU')])
+        field2 = NumericalInputField('gpus', label='GPUs', groups=['gpu'])
+        form = OptionsForm(form_fields=[field1, field2], constraints=[
+            FieldConstraint('image', 'cpu', maximum={'gpus': 0}),
+        ])
+
+        variant, _ = form.get_variant({'students'})
+        self.assertEqual(variant.constraints, ())
+        variant, _ = form.get_variant({'gpu'})
+        self.assertRaises(ValueError, variant.get_normalized_user_options,
+            {'image': ['cpu'], 'gpus': ['1']})
+
+    def test_resolve_user_options(self):
+        async def resolve_async(value):
+            return value.upper()
+
+        field1 = TextInputField('text_attr_1', resolver=resolve_async)
+        field2 = TextInputField('text_attr_2', resolver=lambda value: value + '!')
+        field3 = TextInputField('text_attr_3')
+        form = OptionsForm(form_fields=[field1, field2, field3])
+
+        normalized_options = {'text_attr_1': 'a', 'text_attr_2': 'b', 'text_attr_3': 'c'}
+        resolved_options = asyncio.run(form.resolve_user_options(normalized_options))
+        self.assertEqual(resolved_options, {'text_attr_1': 'A', 'text_attr_2': 'b!', 'text_attr_3': 'c'})
+        self.assertEqual(normalized_options['text_attr_1'], 'a')
+
+    def test_validate_user_options(self):
+        allocations = {'active': 100, 'spent': 0}
+        lookups = []
+
+        async def check_allocation(account):
+            lookups.append(account)
+            await asyncio.sleep(0)
+            if allocations.get(account, 0) <= 0:
+                raise ValueError('No allocation left for {}.'.format(account))
+
+        def check_name(account):
+            if not account.isalpha():
+                raise ValueError('Invalid account name.')
+
+        field1 = TextInputField('account', label='Account', validators=[check_allocation])
+        field2 = TextInputField('project', label='Project', validators=[check_name, check_allocation])
+        form = OptionsForm(form_fields=[field1, field2])
+
+        asyncio.run(form.validate_user_options({'account': 'active', 'project': 'active'}))
+        self.assertEqual(lookups, ['active', 'active'])
+        with self.assertRaises(ValueError) as context:
+            asyncio.run(form.validate_user_options({'account': 'spent', 'project': 'a-1'}))
+        self.assertEqual(str(context.exception),
+            'Account: No allocation left for spent.\nProject: Invalid account name.')
+        # Outcomes are cached per field, validator and value.
+        asyncio.run(form.validate_user_options({'account': 'active', 'project': 'active'}))
+        self.assertEqual(lookups.count('active'), 2)
+
+    def test_get_variant_for_groups(self):
+        field1 = TextInputField('text_attr', label="Everyone")
+        field2 = TextInputField('gpu_attr', label="GPU users", groups=['gpu', 'admin'])
+        field3 = TextInputField('admin_attr', label="Admins", groups=['admin'])
+        form = OptionsForm(form_fields=[field1, field2, field3])
+
+        variant, rendered = form.get_variant({'students'})
+        self.assertEqual(variant.fields, [field1])
+        self.assertEqual(rendered, variant.render_versioned())
+        variant, _ = form.get_variant({'gpu'})
+        self.assertEqual(variant.fields, [field1, field2])
+        variant, _ = form.get_variant({'admin', 'students'})
+        self.assertEqual(variant.fields, [field1, field2, field3])
+
+    def test_get_variant_is_cached_per_visibility_mask(self):
+        field1 = TextInputField('text_attr', label="Everyone")
+        field2 = TextInputField('gpu_attr', label="GPU users", groups=['gpu'])
+        form = OptionsForm(form_fields=[field1, field2], variant_cache_size=1)
+
+        self.assertIs(form.get_variant({'gpu'}), form.get_variant({'gpu', 'students'}))
+        variant = form.get_variant({'students'})
+        self.assertIs(form.get_variant(set()), variant)
+
+    def test_fingerprint_matches_for_identical_definitions(self):
+        form1 = OptionsForm(form_fields=[
+            TextInputField('text_attr', label="Input", attr_value='default'),
+            SelectField('select_attr', choices=[(1, 'One'), (2, 'Two')], default=2),
+        ])
+        form2 = OptionsForm(form_fields=[
+            TextInputField('text_attr', label="Input", attr_value='default'),
+            SelectField('select_attr', choices=[(1, 'One'), (2, 'Two')], default=2),
+        ])
+        self.assertEqual(form1.fingerprint, form2.fingerprint)
+
+    def test_fingerprint_differs_for_different_definitions(self):
+        form1 = OptionsForm(form_fields=[
+            SelectField('select_attr', choices=[(1, 'One'), (2, 'Two')], default=2),
+        ])
+        form2 = OptionsForm(form_fields=[
+            SelectField('select_attr', choices=[(1, 'One'), (2, 'Two')], default=1),
+        ])
+        self.assertNotEqual(form1.fingerprint, form2.fingerprint)
+
+
+class FieldConstraintTestCase(unittest.TestCase):
+    """Tests for optionsspawner.forms.constraints.FieldConstraint."""
+
+    def test_constraints_compare_by_value(self):
+        constraint1 = FieldConstraint('partition', 'debug', allowed={'image': ['a', 'b']})
+        constraint2 = FieldConstraint('partition', 'debug', allowed={'image': ('b', 'a')})
+        self.assertEqual(constraint1, constraint2)
+        self.assertEqual(len({constraint1, constraint2}), 1)
+        self.assertEqual(constraint1.trait_names, {'partition', 'image'})
+
+    def test_constraint_requires_bound(self):
+        self.assertRaises(ValueError, FieldConstraint, 'partition', 'debug')
+
+
+class FieldSpecTestCase(unittest.TestCase):
+    """Tests for optionsspawner.forms.base.FieldSpec."""
+
+    def test_identical_fields_share_spec(self):
+        field1 = SelectField('select_attr', choices=[(1, 'One'), (2, 'Two')], default=2)
+        field2 = SelectField('select_attr', choices=[(1, 'One'), (2, 'Two')], default=2)
+        self.assertIs(field1.spec, field2.spec)
+        self.assertEqual(len({field1.spec, field2.spec}), 1)
+
+    def test_different_fields_have_different_specs(self):
+        field1 = TextInputField('attr', attr_value='1')
+        field2 = NumericalInputField('attr', attr_value='1')
+        field3 = TextInputField('attr', attr_value='2')
+        self.assertNotEqual(field1.spec, field2.spec)
+        self.assertNotEqual(field1.spec, field3.spec)
+
+    def test_fields_hash_by_identity(self):
+        field = TextInputField('attr', attr_value='1')
+        fields = {field: True}
+        field._attributes['value'] = '2'
+        field.invalidate()
+        self.assertIn(field, fields)
+        self.assertNotEqual(field, TextInputField('attr', attr_value='2'))
+
+    def test_spec_with_unhashable_attribute(self):
+        field1 = TextInputField('attr', attr_value=['a'])
+        field2 = TextInputField('attr', attr_value=['a'])
+        self.assertIs(field1.spec, field2.spec)
+
+    def test_spec_is_immutable(self):
+        spec = TextInputField('attr').spec
+        with self.assertRaises(AttributeError):
+            spec.trait_name = 'other'
+
 
 if __name__ == '__main__':
     unittest.main()
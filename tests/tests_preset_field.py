@@ -0,0 +1,71 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Research Computing
+
+import unittest
+from traitlets import Unicode
+from optionsspawner.forms import (
+    OptionsForm,
+    PresetField,
+    TextInputField,
+)
+
+
+PRESETS = [
+    ('small', 'Small', {'mem_limit': '4G', 'cpu_limit': 1.0}),
+    ('gpu', 'GPU', {'mem_limit': '32G', 'cpu_limit': 8.0, 'image': 'cuda'}),
+]
+
+
+class PresetFieldTestCase(unittest.TestCase):
+    """Tests for optionsspawner.forms.presetfield.PresetField."""
+
+    def test_render_preset_choices(self):
+        field = PresetField('profile',
+            label='Profile',
+            presets=PRESETS,
+            default='gpu'
+        )
+        rendered = field.render()
+        self.assertIn('<option id="id_profile_option_0" value="small">Small</option>', rendered)
+        self.assertIn('<option id="id_profile_option_1" value="gpu" selected>GPU</option>', rendered)
+
+    def test_returns_unicode_trait(self):
+        field = PresetField('profile', presets=PRESETS)
+        self.assertIsInstance(field.get_trait(), Unicode)
+        self.assertEqual(field.normalize_user_option(['gpu']), 'gpu')
+        self.assertRaises(ValueError, field.normalize_user_option, ['large'])
+
+    def test_presets_are_frozen(self):
+        field = PresetField('profile', presets=PRESETS)
+        with self.assertRaises(TypeError):
+            field.presets['small']['mem_limit'] = '8G'
+
+    def test_invalid_presets(self):
+        self.assertRaises(ValueError, PresetField, 'profile', presets=[('empty', 'Empty', {})])
+        self.assertRaises(ValueError, PresetField, 'profile',
+            presets=[('small', 'Small', {'mem-limit': '4G'})])
+
+    def test_expand_presets(self):
+        form = OptionsForm(form_fields=[
+            PresetField('profile', presets=PRESETS),
+            TextInputField('account'),
+        ])
+        trait_values = form.expand_presets({'profile': 'gpu', 'account': 'test'})
+        self.assertEqual(trait_values, {
+            'profile': 'gpu',
+            'account': 'test',
+            'mem_limit': '32G',
+            'cpu_limit': 8.0,
+            'image': 'cuda',
+        })
+        self.assertEqual(form.preset_trait_names, {'mem_limit', 'cpu_limit', 'image'})
+
+    def test_presets_setting_form_field_traits_rejected(self):
+        fields = [
+            PresetField('profile', presets=[('small', 'Small', {'account': 'test'})]),
+            TextInputField('account'),
+        ]
+        self.assertRaises(ValueError, OptionsForm, form_fields=fields)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Research Computing
+
+import unittest
+from optionsspawner.forms import (
+    SelectField,
+    create_field,
+    get_field_class,
+)
+
+
+
+class RegistryTestCase(unittest.TestCase):
+    """Tests for optionsspawner.forms.registry."""
+
+    def test_get_builtin_field_class(self):
+        self.assertIs(get_field_class('select'), SelectField)
+
+    def test_unknown_field_type(self):
+        self.assertRaises(ValueError, get_field_class, 'no_such_field_type')
+
+    def test_create_field(self):
+        definition = {
+            'type': 'select',
+            'trait_name': 'partition',
+            'choices': [('debug', 'Debug'), ('normal', 'Normal')],
+            'default': 'normal',
+        }
+        field = create_field(definition)
+        self.assertIs(field.spec, SelectField('partition',
+            choices=[('debug', 'Debug'), ('normal', 'Normal')],
+            default='normal'
+        ).spec)
+        self.assertEqual(definition['type'], 'select')
+        self.assertRaises(ValueError, create_field, {'trait_name': 'partition'})
+
+
+if __name__ == '__main__':
+    unittest.main()
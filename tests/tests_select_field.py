@@ -1,5 +1,6 @@
 # Copyright (c) 2018, Zebula Sampedro, CU Research Computing
 
+import asyncio
 import unittest
 from traitlets import (
     Unicode,
@@ -159,6 +160,135 @@ class SelectFieldTestCase(unittest.TestCase):
         normalized = field.normalize_user_option(['2.0'])
         self.assertEqual(normalized, expected)
 
+    def test_normalize_invalid_selection(self):
+        field = SelectField('test_attr',
+            label='Test Attribute',
+            choices=[(i, 'Option {}'.format(i)) for i in range(20000)]
+        )
+        self.assertEqual(field.normalize_user_option(['19999']), 19999)
+        self.assertRaises(ValueError, field.normalize_user_option, ['20000'])
+
+    def test_render_searchable_omits_options(self):
+        field = SelectField('test_attr',
+            label='Test Attribute',
+            choices=[('option1', 'Option 1'), ('option2', 'Option 2')],
+            default='option2',
+            searchable=True
+        )
+        rendered = field.render()
+        self.assertIn('<input id="id_test_attr" class="form-control" autocomplete="off" '
+            'list="id_test_attr_choices" value="option2" name="test_attr">', rendered)
+        self.assertNotIn('<option', rendered)
+
+    def test_search_prefix_then_substring(self):
+        field = SelectField('test_attr',
+            label='Test Attribute',
+            choices=[('beta', 'Project Beta'), ('alpha', 'Project Alpha'), ('gamma', 'Alphabet')],
+            searchable=True
+        )
+        self.assertEqual(field.search('alph'), [('alpha', 'Project Alpha'), ('gamma', 'Alphabet')])
+        self.assertEqual(field.search('BET'), [('beta', 'Project Beta'), ('gamma', 'Alphabet')])
+        self.assertEqual(field.search('bet', limit=1), [('beta', 'Project Beta')])
+        self.assertEqual(field.search('', limit=0), [])
+        self.assertEqual(field.search('', limit=-1), [])
+        self.assertEqual(field.search('delta'), [])
+
+    def test_normalize_searchable_selection(self):
+        field = SelectField('test_attr',
+            label='Test Attribute',
+            choices=[('option1', 'Option 1'), ('option2', 'Option 2')],
+            searchable=True
+        )
+        self.assertEqual(field.normalize_user_option(['option2']), 'option2')
+        self.assertRaises(ValueError, field.normalize_user_option, ['option3'])
+
+    def test_choices_from_callable(self):
+        field = SelectField('test_attr',
+            label='Test Attribute',
+            choices=lambda: [('debug', 'Debug'), ('normal', 'Normal')],
+            default='normal'
+        )
+        self.assertTrue(field.dynamic)
+        self.assertEqual(field.default_value, 'normal')
+        self.assertEqual(field.normalize_user_option(['debug']), 'debug')
+
+    def test_refreshed_choices_are_applied(self):
+        responses = [
+            [('debug', 'Debug')],
+            [('debug', 'Debug'), ('gpu', 'GPU')],
+        ]
+        field = SelectField('test_attr',
+            label='Test Attribute',
+            choices=lambda: responses.pop(0) if len(responses) > 1 else responses[0],
+            choices_ttl=0
+        )
+        self.assertRaises(ValueError, field.normalize_user_option, ['gpu'])
+
+        async def refresh():
+            # The stale choices are served while the refresh runs in the background.
+            self.assertNotIn('gpu', field.render())
+            await asyncio.sleep(0.1)
+            return field.normalize_user_option(['gpu'])
+        self.assertEqual(asyncio.run(refresh()), 'gpu')
+
+    def test_choices_from_async_callable_requires_initial_choices(self):
+        async def choices():
+            return [('debug', 'Debug')]
+        kwargs = dict(
+            label='Test Attribute',
+            choices=choices
+        )
+        self.assertRaises(ValueError, SelectField, 'test_attr', **kwargs)
+
+    def test_normalize_json_selection(self):
+        field = SelectField('test_attr',
+            choices=[(1.0, 'One'), (2.0, 'Two')]
+        )
+        self.assertEqual(field.normalize_json_option(2), 2.0)
+        self.assertEqual(field.normalize_json_option(None), 1.0)
+        self.assertRaises(ValueError, field.normalize_json_option, '2.0')
+        self.assertRaises(ValueError, field.normalize_json_option, 3.0)
+        self.assertEqual(field.json_schema()['enum'], [1.0, 2.0])
+        self.assertEqual(field.json_schema()['type'], 'number')
+
+    def test_render_selects_least_loaded_choice(self):
+        expected = ("""<label for="test_attr">Test Attribute</label>\n"""
+        """<select id="id_test_attr" class="form-control" name="test_attr">\n"""
+        """<option id="id_test_attr_option_0" value="debug" disabled>Debug (full)</option>\n"""
+        """<option id="id_test_attr_option_1" value="normal">Normal</option>\n"""
+        """<option id="id_test_attr_option_2" value="long" selected>Long</option>\n"""
+        """</select>\n""")
+        field = SelectField('test_attr',
+            label='Test Attribute',
+            choices=[('debug', 'Debug'), ('normal', 'Normal'), ('long', 'Long')],
+            capacity=lambda: {'debug': 0, 'normal': 4, 'long': 12}
+        )
+        self.assertTrue(field.dynamic)
+        self.assertEqual(field.render(), expected)
+        self.assertEqual(field.selected_value, 'long')
+        # Capacity only steers the form, the default and submissions are unchanged.
+        self.assertEqual(field.default_value, 'debug')
+        self.assertEqual(field.normalize_user_option(['debug']), 'debug')
+
+    def test_refreshed_capacity_is_applied(self):
+        responses = [{'debug': 4, 'normal': 1}, {'debug': 0, 'normal': 1}]
+        field = SelectField('test_attr',
+            label='Test Attribute',
+            choices=[('debug', 'Debug'), ('normal', 'Normal')],
+            capacity=lambda: responses.pop(0) if len(responses) > 1 else responses[0],
+            capacity_ttl=0,
+            disable_full=False
+        )
+        self.assertEqual(field.selected_value, 'debug')
+
+        async def refresh():
+            field.compile()
+            await asyncio.sleep(0.1)
+            return field.compile()
+        rendered = asyncio.run(refresh())
+        self.assertEqual(field.selected_value, 'normal')
+        self.assertIn('value="debug">Debug (full)', rendered)
+
 
 if __name__ == '__main__':
     unittest.main()
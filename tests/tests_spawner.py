@@ -1,13 +1,16 @@
 # Copyright (c) 2018, Zebula Sampedro, CU Research Computing
 
+import asyncio
 import logging
 import os
 import signal
+import sqlite3
 import sys
 import tempfile
 import time
 import unittest
 import contextlib
+from unittest import mock
 from getpass import getuser
 from traitlets.config.loader import Config
 from traitlets import (
@@ -15,7 +18,10 @@ from traitlets import (
     Float,
 )
 
-from jupyterhub.spawner import LocalProcessSpawner
+from jupyterhub.spawner import (
+    Spawner,
+    LocalProcessSpawner,
+)
 from jupyterhub import orm
 
 from optionsspawner import OptionsFormSpawner
@@ -23,6 +29,7 @@ from optionsspawner.forms import (
     OptionsForm,
     TextInputField,
     NumericalInputField,
+    PresetField,
 )
 
 
@@ -33,6 +40,18 @@ print(sys.argv)
 time.sleep(10)
 """
 
+class StandInSpawner(Spawner):
+    """Child spawner that starts instantly without launching a process."""
+
+    async def start(self):
+        return ('127.0.0.1', 8888)
+
+    async def poll(self):
+        return None
+
+    async def stop(self, now=False):
+        pass
+
 @contextlib.contextmanager
 def suppress_output():
     """Prevent noisy spawners from cluttering the test logs."""
@@ -145,6 +164,408 @@ class OptionsFormSpawnerTestCase(unittest.TestCase):
         self.assertEqual(spawner.test_attr_text, 'not_default')
         self.assertEqual(spawner.test_attr_numerical, 4.0)
 
+    def test_set_trait_values_skips_unchanged_values(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        config['OptionsFormSpawner']['options_skip_unchanged_traits'] = True
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        trait = spawner.traits()['test_attr_text']
+        spawner.user_options = {'test_attr_text': ['value']}
+        spawner._set_trait_values_from_options()
+        with mock.patch.object(trait, 'validate', wraps=trait.validate) as validate:
+            spawner._set_trait_values_from_options()
+        self.assertEqual(spawner.test_attr_text, 'value')
+        self.assertFalse(validate.called)
+
+    def test_set_preset_trait_values_on_spawner(self):
+        form_fields = [
+            PresetField('test_attr_profile',
+                presets=[
+                    ('small', 'Small', {'mem_limit': '1G', 'cpu_limit': 1.0}),
+                    ('large', 'Large', {'mem_limit': '8G', 'cpu_limit': 4.0}),
+                ]
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        spawner.user_options = {'test_attr_profile': ['large']}
+        spawner._set_trait_values_from_options()
+        self.assertEqual(spawner.test_attr_profile, 'large')
+        self.assertEqual(spawner.mem_limit, 8 * 1024 ** 3)
+        self.assertEqual(spawner.cpu_limit, 4.0)
+
+    def test_spawners_share_compiled_options_form(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+                attr_value='default'
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        with suppress_output():
+            spawner1 = new_spawner(config=config)
+            spawner2 = new_spawner(config=config)
+
+        self.assertIs(spawner1.options_form_builder, spawner2.options_form_builder)
+        self.assertEqual(spawner1.options_form, spawner2.options_form)
+
+    def test_form_fields_from_definitions(self):
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = [
+            {'type': 'text', 'trait_name': 'test_attr_text', 'attr_value': 'default'},
+        ]
+        with suppress_output():
+            spawner1 = new_spawner(config=config)
+            spawner2 = new_spawner(config=config)
+
+        self.assertIs(spawner1.options_form_builder, spawner2.options_form_builder)
+        self.assertIsInstance(spawner1.options_form_builder.fields[0], TextInputField)
+        self.assertEqual(spawner1.test_attr_text, 'default')
+
+    def test_variant_cache_size_not_shared(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        with suppress_output():
+            spawner1 = new_spawner(config=config)
+            config['OptionsFormSpawner']['form_variant_cache_size'] = 1
+            spawner2 = new_spawner(config=config)
+
+        self.assertIsNot(spawner1.options_form_builder, spawner2.options_form_builder)
+
+    def test_spawners_share_trait_class(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+                attr_value='default'
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        with suppress_output():
+            spawner1 = new_spawner(config=config)
+            spawner2 = new_spawner(config=config)
+
+        spawner1._apply_traits_from_fields()
+        self.assertIs(type(spawner1), type(spawner2))
+        self.assertTrue(spawner1.has_trait('test_attr_text'))
+        self.assertEqual(spawner1.test_attr_text, 'default')
+
+    def test_group_restricted_fields_hidden_from_non_members(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+            ),
+            NumericalInputField('test_attr_gpus',
+                label='GPUs',
+                groups=['gpu']
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        rendered = spawner.options_form(spawner)
+        self.assertIn('test_attr_text', rendered)
+        self.assertNotIn('test_attr_gpus', rendered)
+        options = spawner.options_from_form({'test_attr_gpus': ['2']})
+        self.assertEqual(options, {'test_attr_text': None})
+        self.assertTrue(spawner.has_trait('test_attr_gpus'))
+
+    def test_collapsed_fieldset_compiled_for_user(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+            ),
+            NumericalInputField('test_attr_numerical',
+                label='Test Numerical',
+                fieldset='advanced'
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        config['OptionsFormSpawner']['form_collapsed_fieldsets'] = {'advanced': 'Advanced'}
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        self.assertNotIn('test_attr_numerical', spawner.options_form)
+        self.assertIn('test_attr_numerical', spawner.compile_options_fieldset('advanced').html)
+        self.assertIsNone(spawner.compile_options_fieldset('other'))
+
+    def test_unopened_fieldset_keeps_previous_options(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+            ),
+            NumericalInputField('test_attr_numerical',
+                label='Test Numerical',
+                fieldset='advanced'
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        config['OptionsFormSpawner']['form_collapsed_fieldsets'] = {'advanced': 'Advanced'}
+        config['OptionsFormSpawner']['child_class'] = StandInSpawner
+        config['OptionsFormSpawner']['options_store_path'] = ':memory:'
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        spawner.user_options = spawner.options_from_form({
+            'test_attr_text': ['first'],
+            'test_attr_numerical': ['7'],
+            'options_form_fieldsets': ['advanced'],
+        })
+        asyncio.run(spawner.start())
+        options = spawner.options_from_form({'test_attr_text': ['second']})
+        self.assertEqual(options, {'test_attr_text': ['second'], 'test_attr_numerical': ['7']})
+
+    def test_options_from_outdated_form_rejected(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        self.assertIn(spawner.options_form_version, spawner.options_form)
+        self.assertEqual(len(spawner.options_form_digest), 64)
+        form_data = {
+            'test_attr_text': ['test'],
+            'options_form_digest': [spawner.options_form_version],
+        }
+        self.assertEqual(spawner.options_from_form(form_data), {'test_attr_text': ['test']})
+        form_data['options_form_digest'] = ['outdated']
+        self.assertRaises(ValueError, spawner.options_from_form, form_data)
+
+    def test_restart_with_same_options_reuses_child(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        config['OptionsFormSpawner']['child_class'] = StandInSpawner
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        # JupyterHub clears the spawner's state before each start.
+        spawner.user_options = {'test_attr_text': ['first']}
+        spawner.clear_state()
+        asyncio.run(spawner.start())
+        child_spawner = spawner.child_spawner
+        self.assertEqual(child_spawner.test_attr_text, 'first')
+
+        # Values are not re-applied when the options are unchanged.
+        child_spawner.test_attr_text = 'modified'
+        spawner.clear_state()
+        asyncio.run(spawner.start())
+        self.assertIs(spawner.child_spawner, child_spawner)
+        self.assertEqual(child_spawner.test_attr_text, 'modified')
+
+        spawner.user_options = {'test_attr_text': ['second']}
+        spawner.clear_state()
+        asyncio.run(spawner.start())
+        self.assertIsNot(spawner.child_spawner, child_spawner)
+        self.assertEqual(spawner.child_spawner.test_attr_text, 'second')
+
+    def test_start_with_previous_options(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        config['OptionsFormSpawner']['child_class'] = StandInSpawner
+        config['OptionsFormSpawner']['options_store_path'] = ':memory:'
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        self.assertNotIn('options_form_previous', spawner.options_form(spawner))
+        spawner.user_options = spawner.options_from_form({'test_attr_text': ['previous']})
+        asyncio.run(spawner.start())
+        self.assertIn('options_form_previous', spawner.options_form(spawner))
+
+        form_data = {
+            'test_attr_text': [''],
+            'options_form_previous': ['1'],
+            'options_form_digest': ['outdated'],
+        }
+        self.assertEqual(spawner.options_from_form(form_data), {'test_attr_text': ['previous']})
+
+    def test_failed_start_does_not_store_options(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        config['OptionsFormSpawner']['child_class'] = StandInSpawner
+        config['OptionsFormSpawner']['options_store_path'] = ':memory:'
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        spawner.user_options = spawner.options_from_form({'test_attr_text': ['failed']})
+        failing_start = mock.patch.object(StandInSpawner, 'start', side_effect=RuntimeError)
+        with failing_start, mock.patch.object(spawner._options_store, 'put') as put:
+            with self.assertRaises(RuntimeError):
+                asyncio.run(spawner.start())
+        put.assert_not_called()
+
+    def test_start_succeeds_when_options_cannot_be_stored(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        config['OptionsFormSpawner']['child_class'] = StandInSpawner
+        config['OptionsFormSpawner']['options_store_path'] = ':memory:'
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        spawner.user_options = spawner.options_from_form({'test_attr_text': ['unsaved']})
+        failing_put = mock.patch.object(spawner._options_store, 'put',
+            side_effect=sqlite3.OperationalError('database is locked')
+        )
+        with failing_put, self.assertLogs(spawner.log, 'ERROR'):
+            self.assertEqual(asyncio.run(spawner.start()), ('127.0.0.1', 8888))
+
+    def test_start_waits_for_admission(self):
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        config['OptionsFormSpawner']['child_class'] = StandInSpawner
+        config['OptionsFormSpawner']['options_admission_limits'] = {'test_attr_text': 1}
+        config['OptionsFormSpawner']['options_admission_timeout'] = 0.01
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        async def start_while_admitted():
+            async with spawner._admission_controller.admit({'test_attr_text': 'full'}):
+                await spawner.start()
+
+        spawner.user_options = {'test_attr_text': ['full']}
+        self.assertRaises(TimeoutError, asyncio.run, start_while_admitted())
+        spawner.user_options = {'test_attr_text': ['other']}
+        asyncio.run(start_while_admitted())
+
+    def test_start_applies_resolved_values(self):
+        async def resolve_account(value):
+            return '{}-resolved'.format(value)
+
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+                resolver=resolve_account,
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        config['OptionsFormSpawner']['child_class'] = StandInSpawner
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        spawner.user_options = {'test_attr_text': ['account']}
+        asyncio.run(spawner.start())
+        self.assertEqual(spawner.child_spawner.test_attr_text, 'account-resolved')
+
+    def test_restart_with_resolvers_resolves_again(self):
+        resolutions = []
+
+        async def resolve_account(value):
+            resolutions.append(value)
+            return '{}-{}'.format(value, len(resolutions))
+
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+                resolver=resolve_account,
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        config['OptionsFormSpawner']['child_class'] = StandInSpawner
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        spawner.user_options = {'test_attr_text': ['account']}
+        for _ in range(3):
+            spawner.clear_state()
+            asyncio.run(spawner.start())
+        self.assertEqual(len(resolutions), 3)
+        self.assertEqual(spawner.child_spawner.test_attr_text, 'account-3')
+
+    def test_start_fails_when_resolvers_time_out(self):
+        async def resolve_slowly(value):
+            await asyncio.sleep(10)
+
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+                resolver=resolve_slowly,
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        config['OptionsFormSpawner']['child_class'] = StandInSpawner
+        config['OptionsFormSpawner']['options_start_timeout'] = 0.01
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        spawner.user_options = {'test_attr_text': ['account']}
+        self.assertRaises(TimeoutError, asyncio.run, spawner.start())
+
+    def test_start_rejects_invalid_options(self):
+        async def check_account(value):
+            if value != 'valid':
+                raise ValueError('Unknown account.')
+
+        form_fields = [
+            TextInputField('test_attr_text',
+                label='Test Text',
+                validators=[check_account],
+            ),
+        ]
+        config = get_config()
+        config['OptionsFormSpawner']['form_fields'] = form_fields
+        config['OptionsFormSpawner']['child_class'] = StandInSpawner
+        with suppress_output():
+            spawner = new_spawner(config=config)
+
+        spawner.user_options = {'test_attr_text': ['invalid']}
+        self.assertRaises(ValueError, asyncio.run, spawner.start())
+        self.assertIsNone(spawner.child_spawner)
+        spawner.user_options = {'test_attr_text': ['valid']}
+        asyncio.run(spawner.start())
+        self.assertEqual(spawner.child_spawner.test_attr_text, 'valid')
+
 
 if __name__ == '__main__':
     unittest.main()
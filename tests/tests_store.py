@@ -0,0 +1,48 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Research Computing
+
+import os
+import tempfile
+import unittest
+from optionsspawner.store import OptionsStore
+
+
+
+class OptionsStoreTestCase(unittest.TestCase):
+    """Tests for optionsspawner.store.OptionsStore."""
+
+    def test_get_missing_user(self):
+        store = OptionsStore(':memory:')
+        self.assertIsNone(store.get('user'))
+
+    def test_put_and_get(self):
+        store = OptionsStore(':memory:')
+        store.put('user', {'text_attr': ['test'], 'select_attr': ['2']})
+        options = store.get('user')
+        self.assertEqual(options, {'text_attr': ['test'], 'select_attr': ['2']})
+        # Callers get a copy of the cached options.
+        options['text_attr'] = ['changed']
+        self.assertEqual(store.get('user')['text_attr'], ['test'])
+
+    def test_delete(self):
+        store = OptionsStore(':memory:')
+        store.put('user', {'text_attr': ['test']})
+        store.delete('user')
+        self.assertIsNone(store.get('user'))
+
+    def test_options_persist_across_stores(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'options.sqlite')
+            store = OptionsStore(path, cache_size=1)
+            store.put('user1', {'text_attr': ['first']})
+            store.put('user2', {'text_attr': ['second']})
+            # user1 was evicted from the cache, and is read back from the database.
+            self.assertEqual(store.get('user1'), {'text_attr': ['first']})
+            store.close()
+
+            store = OptionsStore(path)
+            self.assertEqual(store.get('user2'), {'text_attr': ['second']})
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
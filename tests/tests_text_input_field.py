@@ -102,6 +102,30 @@ class TextInputFieldTestCase(unittest.TestCase):
         )
         self.assertRaises(ValueError, field.normalize_user_option, [''])
 
+    def test_normalize_json_string(self):
+        field = TextInputField('test_attr',
+            label='Test Attribute',
+            attr_value='default'
+        )
+        self.assertEqual(field.normalize_json_option('test'), 'test')
+        self.assertEqual(field.normalize_json_option(None), 'default')
+        self.assertRaises(ValueError, field.normalize_json_option, ['test'])
+
+    def test_normalize_length_bounds(self):
+        field = TextInputField('test_attr',
+            label='Test Attribute',
+            attr_minlength=2,
+            attr_maxlength=4
+        )
+        self.assertEqual(field.json_schema()['minLength'], 2)
+        self.assertEqual(field.json_schema()['maxLength'], 4)
+        self.assertEqual(field.normalize_user_option(['test']), 'test')
+        self.assertEqual(field.normalize_json_option('test'), 'test')
+        for value in ('t', 'tests'):
+            self.assertRaises(ValueError, field.normalize_user_option, [value])
+            self.assertRaises(ValueError, field.normalize_json_option, value)
+        self.assertRaises(ValueError, field.normalize_json_option, '')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,79 @@
+# Copyright (c) 2018, Zebula Sampedro, CU Research Computing
+
+import asyncio
+import unittest
+from optionsspawner.utils import (
+    RefreshingCache,
+    TTLCache,
+)
+
+
+
+class StubProvider:
+    """Returns each of the given values in turn, repeating the last one."""
+
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+
+    def __call__(self):
+        value = self.values[min(self.calls, len(self.values) - 1)]
+        self.calls += 1
+        return value
+
+
+class RefreshingCacheTestCase(unittest.IsolatedAsyncioTestCase):
+    """Tests for optionsspawner.utils.RefreshingCache."""
+
+    async def test_primes_from_sync_provider(self):
+        provider = StubProvider('first', 'second')
+        cache = RefreshingCache(provider, ttl=60)
+        self.assertEqual(cache.get(), 'first')
+        self.assertEqual(provider.calls, 1)
+
+    async def test_async_provider_requires_initial(self):
+        async def provider():
+            return 'value'
+        self.assertRaises(ValueError, RefreshingCache, provider, 60)
+
+    async def test_serves_stale_value_while_refreshing(self):
+        provider = StubProvider('first', 'second')
+        cache = RefreshingCache(provider, ttl=0)
+        self.assertEqual(cache.get(), 'first')
+        await asyncio.sleep(0.1)
+        self.assertEqual(cache.get(), 'second')
+
+    async def test_refresh_async_provider(self):
+        async def provider():
+            return 'refreshed'
+        cache = RefreshingCache(provider, ttl=60, initial='initial')
+        self.assertEqual(cache.get(), 'initial')
+        self.assertEqual(await cache.refresh(), 'refreshed')
+
+    async def test_rejected_refresh_keeps_value(self):
+        def validate(value):
+            if not value:
+                raise ValueError('Empty value.')
+        provider = StubProvider('first', '')
+        cache = RefreshingCache(provider, ttl=60, validate=validate)
+        with self.assertLogs('optionsspawner.utils'):
+            self.assertEqual(await cache.refresh(), 'first')
+
+
+class TTLCacheTestCase(unittest.TestCase):
+    """Tests for optionsspawner.utils.TTLCache."""
+
+    def test_entries_expire(self):
+        cache = TTLCache(ttl=60)
+        cache.put('key', None)
+        self.assertIn('key', cache)
+        self.assertIsNone(cache.get('key', 'missing'))
+
+        cache = TTLCache(ttl=0)
+        cache.put('key', 'value')
+        self.assertNotIn('key', cache)
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()